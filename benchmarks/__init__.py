@@ -0,0 +1,34 @@
+"""
+Benchmarks for the hot paths of KU Polls.
+
+Each benchmark is a script run from the project directory, for example
+``python -m benchmarks.asgi_views``. It sets up Django with the project
+settings and runs against a throwaway test database, so the configured
+database server must be reachable but its data is left alone.
+"""
+import contextlib
+import os
+import django
+
+
+def setup():
+    """Configure Django for a benchmark script."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+    # The benchmarks send every request from one client
+    os.environ.setdefault("RATE_LIMITS_ENABLED", "False")
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_databases():
+    """Create the test databases for the duration of the block."""
+    from django.test.utils import (setup_databases, setup_test_environment,
+                                   teardown_databases,
+                                   teardown_test_environment)
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,107 @@
+"""
+Compare requests per second of the sync and async polls views under ASGI.
+
+Requests go through Django's ASGI request handler with the async test
+client, so sync views pay the same thread hop as under a real ASGI server.
+
+    python -m benchmarks.asgi_views --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+from benchmarks import setup, test_databases
+
+
+def build_urlconfs():
+    """Return the site URLconf with the sync and with the async polls views."""
+    from django.urls import include, path
+    from mysite import urls as site_urls
+    from polls import urls as polls_urls
+
+    def urlconf(patterns):
+        return type("URLConf", (), {"urlpatterns": [
+            path("polls/", include((patterns, "polls"))),
+        ] + site_urls.urlpatterns})
+
+    return {"sync": urlconf(polls_urls.sync_urlpatterns),
+            "async": urlconf(polls_urls.async_urlpatterns)}
+
+
+def create_poll(choices, users):
+    """Create one open question with choices and users to vote with."""
+    from django.contrib.auth.models import User
+    from polls.models import Choice, Question
+    question = Question.objects.create(question_text="Benchmark question")
+    Choice.objects.bulk_create([Choice(question=question, choice_text=f"Choice {i}")
+                                for i in range(choices)])
+    User.objects.bulk_create([User(username=f"bench{i}") for i in range(users)])
+    return question, list(question.choice_set.all()), list(User.objects.filter(username__startswith="bench"))
+
+
+async def run_endpoint(clients, requests, send):
+    """Send requests spread over the clients, return requests per second."""
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        while not queue.empty():
+            i = queue.get_nowait()
+            response = await send(client, i)
+            if response.status_code >= 400:
+                raise RuntimeError(f"request {i} failed with {response.status_code}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    return requests / (time.perf_counter() - start)
+
+
+async def bench_mode(question, choices, users, args):
+    """Benchmark the detail, results and vote endpoints in the current mode."""
+    from django.test import AsyncClient
+    from django.urls import reverse
+    clients = []
+    for user in users[:args.concurrency]:
+        client = AsyncClient()
+        await client.aforce_login(user)
+        clients.append(client)
+    detail = reverse("polls:detail", args=(question.id,))
+    results = reverse("polls:results", args=(question.id,))
+    vote = reverse("polls:vote", args=(question.id,))
+    return {
+        "detail": await run_endpoint(clients, args.requests, lambda c, i: c.get(detail)),
+        "results": await run_endpoint(clients, args.requests, lambda c, i: c.get(results)),
+        "vote": await run_endpoint(
+            clients, args.requests,
+            lambda c, i: c.post(vote, {"choice": choices[i % len(choices)].id})),
+    }
+
+
+def main():
+    """Run the benchmark and print a table of requests per second."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--choices", type=int, default=5, help="choices of the question")
+    args = parser.parse_args()
+
+    setup()
+    from django.core.cache import cache
+    from django.test.utils import override_settings
+
+    with test_databases():
+        question, choices, users = create_poll(args.choices, args.concurrency)
+        rates = {}
+        for mode, urlconf in build_urlconfs().items():
+            cache.clear()
+            with override_settings(ROOT_URLCONF=urlconf):
+                rates[mode] = asyncio.run(bench_mode(question, choices, users, args))
+
+    print(f"{'endpoint':<10}{'sync req/s':>14}{'async req/s':>14}{'change':>10}")
+    for endpoint in rates["sync"]:
+        before, after = rates["sync"][endpoint], rates["async"][endpoint]
+        print(f"{endpoint:<10}{before:>14.1f}{after:>14.1f}{(after / before - 1):>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+End-to-end benchmark of the index, detail, results and vote endpoints.
+
+A synthetic data set is created with the generate_polls command in a
+throwaway test database, then every endpoint is driven through Django's
+test client. For each endpoint the latency percentiles, the throughput and
+the SQL queries per request are printed and written as JSON, so runs on
+different commits can be compared with --baseline.
+
+    python -m benchmarks.endpoints --requests 500 --output bench.json
+    python -m benchmarks.endpoints --baseline bench.json
+"""
+import argparse
+import datetime
+import io
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from benchmarks import setup, test_databases
+
+
+ENDPOINTS = ["index", "detail", "results", "vote"]
+
+
+def percentile(samples, fraction):
+    """Return the nearest-rank percentile of sorted samples."""
+    index = max(0, min(len(samples) - 1, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def git_commit():
+    """Return the commit being benchmarked, if it can be told."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class EndpointRunner:
+    """Send requests to one endpoint and record latency and queries."""
+
+    def __init__(self, clients, questions, rng):
+        """Use logged in clients and the open questions of the data set."""
+        self.clients = clients
+        self.questions = questions
+        self.random = rng
+
+    def request(self, endpoint):
+        """Send one request to endpoint and return the response."""
+        from django.urls import reverse
+        client = self.random.choice(self.clients)
+        question, choice_ids = self.random.choice(self.questions)
+        if endpoint == "index":
+            return client.get(reverse("polls:index"))
+        if endpoint == "detail":
+            return client.get(reverse("polls:detail", args=(question,)))
+        if endpoint == "results":
+            return client.get(reverse("polls:results", args=(question,)))
+        return client.post(reverse("polls:vote", args=(question,)),
+                           {"choice": self.random.choice(choice_ids)})
+
+    def run(self, endpoint, requests, warmup):
+        """Measure requests to endpoint and return its statistics."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        for _ in range(warmup):
+            self.request(endpoint)
+        latencies, queries = [], []
+        start = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                response = self.request(endpoint)
+                latencies.append((time.perf_counter() - began) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{endpoint} failed with {response.status_code}")
+            queries.append(len(captured.captured_queries))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return {
+            "requests": requests,
+            "throughput": requests / elapsed,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "mean_queries": statistics.fmean(queries),
+            "max_queries": max(queries),
+        }
+
+
+def prepare(args):
+    """Create the data set and return logged in clients and open questions."""
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+    from polls.models import Question
+    call_command("generate_polls", questions=args.questions, choices=args.choices,
+                 users=args.users, votes=args.votes, skew=args.skew, seed=args.seed,
+                 prefix="bench", stdout=io.StringIO())
+    clients = []
+    for user in User.objects.filter(username__startswith="bench")[:args.clients]:
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+    questions = [(question.pk, [choice.pk for choice in question.choice_set.all()])
+                 for question in Question.objects.with_status().filter(is_open=True).
+                 prefetch_related("choice_set")]
+    return clients, questions
+
+
+def print_report(report, baseline=None):
+    """Print the statistics of each endpoint, with changes from baseline."""
+    header = f"{'endpoint':<9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+    print(header + ("  vs baseline (req/s, p95)" if baseline else ""))
+    for endpoint, stats in report["endpoints"].items():
+        line = (f"{endpoint:<9}{stats['throughput']:>9.1f}{stats['p50_ms']:>9.2f}"
+                f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['mean_queries']:>9.1f}")
+        old = baseline and baseline["endpoints"].get(endpoint)
+        if old:
+            line += (f"  {stats['throughput'] / old['throughput'] - 1:+.1%}, "
+                     f"{stats['p95_ms'] / old['p95_ms'] - 1:+.1%}")
+        print(line)
+
+
+def main():
+    """Run the benchmark, print the report and write it as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--choices", type=int, default=5)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--votes", type=int, default=20000)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--clients", type=int, default=50, help="logged in users sending requests")
+    parser.add_argument("--requests", type=int, default=300, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per endpoint")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="compare with a report written before")
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    with test_databases():
+        clients, questions = prepare(args)
+        runner = EndpointRunner(clients, questions, random.Random(args.seed))
+        endpoints = {endpoint: runner.run(endpoint, args.requests, args.warmup)
+                     for endpoint in args.endpoints}
+        vendor = connection.vendor
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": vendor,
+        "arguments": vars(args),
+        "endpoints": endpoints,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as stream:
+            baseline = json.load(stream)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as stream:
+            json.dump(report, stream, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Compare the latency of the vote and login paths with each polls log handler.
+
+The old synchronous FileHandler, which writes and flushes on the request
+thread, is compared with the QueueFileHandler of mysite.log, which only
+queues the record. A fast password hasher is used so that hashing does not
+hide the cost of logging on the login path.
+
+    python -m benchmarks.log_handlers --requests 1000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from benchmarks import setup, test_databases
+
+
+def percentile(samples, fraction):
+    """Return the nearest-rank percentile of sorted samples."""
+    return samples[max(0, min(len(samples) - 1, round(fraction * len(samples)) - 1))]
+
+
+def make_handler(mode, path):
+    """Return the handler of mode writing to path."""
+    from mysite.log import JsonFormatter, QueueFileHandler
+    if mode == "file":
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter(
+            "{levelname}: {name} {asctime} {module} {process:d} {thread:d} -> {message}", style="{"))
+    else:
+        handler = QueueFileHandler(path)
+        handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def measure(requests, send):
+    """Call send requests times and return the p50 and p95 latency in ms."""
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        send(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return percentile(latencies, 0.50), percentile(latencies, 0.95)
+
+
+def bench_mode(mode, directory, args):
+    """Measure a logger call and the vote and login paths with one handler."""
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.urls import reverse
+    from polls.models import Choice, Question
+    logger = logging.getLogger("polls")
+    old_handlers, logger.handlers = logger.handlers, [make_handler(mode, os.path.join(directory, f"{mode}.log"))]
+    try:
+        question = Question.objects.create(question_text=f"Benchmark question {mode}")
+        choices = Choice.objects.bulk_create([Choice(question=question, choice_text=f"Choice {i}")
+                                              for i in range(5)])
+        User.objects.create_user(username=f"bench-{mode}", password="bench")
+        voter, anonymous = Client(), Client()
+        voter.login(username=f"bench-{mode}", password="bench")
+        vote_url, login_url = reverse("polls:vote", args=(question.id,)), reverse("login")
+        return {
+            "log call": measure(args.requests, lambda i: logger.info(
+                "%s vote for %s has been recorded", "bench", "Choice", extra={"event": "vote"})),
+            "vote": measure(args.requests, lambda i: voter.post(
+                vote_url, {"choice": choices[i % len(choices)].id})),
+            "login": measure(args.requests, lambda i: anonymous.post(
+                login_url, {"username": f"bench-{mode}", "password": "bench"})),
+        }
+    finally:
+        for handler in logger.handlers:
+            handler.close()
+        logger.handlers = old_handlers
+
+
+def main():
+    """Run the benchmark and print p50 and p95 latency of each handler."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500, help="measured calls per path")
+    args = parser.parse_args()
+
+    setup()
+    from django.test.utils import override_settings
+    results = {}
+    with test_databases(), tempfile.TemporaryDirectory() as directory, \
+            override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]):
+        for mode in ("file", "queue"):
+            results[mode] = bench_mode(mode, directory, args)
+
+    print(f"{'path':<10}{'file p50':>10}{'p95':>9}{'queue p50':>11}{'p95':>9}  (ms)")
+    for path in results["file"]:
+        (file50, file95), (queue50, queue95) = results["file"][path], results["queue"][path]
+        print(f"{path:<10}{file50:>10.3f}{file95:>9.3f}{queue50:>11.3f}{queue95:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
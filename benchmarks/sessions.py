@@ -0,0 +1,74 @@
+"""
+Count the queries an authenticated request spends on its session and user.
+
+The index, detail and results pages are requested by a logged in user with
+database sessions and the plain ModelBackend, as before, and with each
+session store combined with the cached user backend. Each page is requested
+once to warm the caches before its queries are counted.
+
+    python -m benchmarks.sessions
+"""
+import argparse
+from benchmarks import setup, test_databases
+
+
+MODES = {
+    "db": ("db", "django.contrib.auth.backends.ModelBackend"),
+    "db + user cache": ("db", "mysite.auth.CachedModelBackend"),
+    "cached_db + user cache": ("cached_db", "mysite.auth.CachedModelBackend"),
+    "signed_cookies + user cache": ("signed_cookies", "mysite.auth.CachedModelBackend"),
+}
+
+
+def count_queries(client, url):
+    """Return the total, session and user queries of a request to url."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+    sql = [query["sql"] for query in queries]
+    return (len(sql), sum("django_session" in query for query in sql),
+            sum("auth_user" in query for query in sql))
+
+
+def bench_mode(store, backend, urls):
+    """Log in with store and backend and count the queries of each url."""
+    from django.test import Client
+    from django.test.utils import override_settings
+    with override_settings(SESSION_ENGINE=f"django.contrib.sessions.backends.{store}",
+                           AUTHENTICATION_BACKENDS=[backend]):
+        client = Client()
+        client.login(username="bench", password="bench")
+        return {name: count_queries(client, url) for name, url in urls.items()}
+
+
+def main():
+    """Print the queries per request of each page in each mode."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.parse_args()
+
+    setup()
+    from django.contrib.auth.models import User
+    from django.test.utils import override_settings
+    from django.urls import reverse
+    from polls.models import Choice, Question
+    with test_databases(), override_settings(
+            PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]):
+        question = Question.objects.create(question_text="Benchmark question")
+        Choice.objects.bulk_create([Choice(question=question, choice_text=f"Choice {i}") for i in range(5)])
+        User.objects.create_user(username="bench", password="bench")
+        urls = {"index": reverse("polls:index"),
+                "detail": reverse("polls:detail", args=(question.id,)),
+                "results": reverse("polls:results", args=(question.id,))}
+        results = {mode: bench_mode(*MODES[mode], urls) for mode in MODES}
+
+    print("Queries per request: total (session, user)")
+    print(f"{'mode':<30}" + "".join(f"{name:>14}" for name in urls))
+    for mode, pages in results.items():
+        print(f"{mode:<30}" + "".join(
+            f"{f'{total} ({session}, {user})':>14}" for total, session, user in pages.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure the render time of the index page with thousands of questions.
+
+The index template is rendered directly, without the database, for an
+anonymous and a logged in user in three setups: template loaders without
+caching and no fragment cache, the cached template loader alone, and the
+cached loader with the header and question card fragments cached.
+
+    python -m benchmarks.templates --questions 5000 --renders 20
+"""
+import argparse
+import statistics
+import time
+from benchmarks import setup
+
+
+LOADERS = ["django.template.loaders.filesystem.Loader",
+           "django.template.loaders.app_directories.Loader"]
+DUMMY_CACHE = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+FRAGMENT_CACHE = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                  "LOCATION": "benchmark-templates", "OPTIONS": {"MAX_ENTRIES": 1_000_000}}
+
+
+def templates_setting(loaders):
+    """Return the TEMPLATES setting with loaders instead of the project's."""
+    from django.conf import settings
+    engine = dict(settings.TEMPLATES[0])
+    engine["OPTIONS"] = {**engine["OPTIONS"], "loaders": loaders}
+    return [engine]
+
+
+def make_questions(count):
+    """Return unsaved questions as the index view annotates them."""
+    from polls.models import Question
+    questions = []
+    for pk in range(1, count + 1):
+        question = Question(pk=pk, question_text=f"Benchmark question {pk}")
+        question.is_open = pk % 5 != 0
+        questions.append(question)
+    return questions
+
+
+def measure(questions, user, renders):
+    """Render the index renders times and return the mean time in ms."""
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory
+    request = RequestFactory().get("/polls/")
+    request.user = user
+    context = {"latest_question_list": questions, "next_cursor": None}
+    render_to_string("polls/index.html", context, request=request)
+    times = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        render_to_string("polls/index.html", context, request=request)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.fmean(times)
+
+
+def main():
+    """Print the mean render time of each setup and user."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--renders", type=int, default=20)
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth.models import AnonymousUser, User
+    from django.test.utils import override_settings
+    questions = make_questions(args.questions)
+    users = {"anonymous": AnonymousUser(), "user": User(pk=1, username="bench")}
+    setups = {
+        "no caching": (templates_setting(LOADERS), DUMMY_CACHE),
+        "cached loader": (templates_setting([("django.template.loaders.cached.Loader", LOADERS)]),
+                          DUMMY_CACHE),
+        "+ fragments": (templates_setting([("django.template.loaders.cached.Loader", LOADERS)]),
+                        FRAGMENT_CACHE),
+    }
+    print(f"Index with {args.questions} questions, mean of {args.renders} renders (ms)")
+    print(f"{'setup':<15}" + "".join(f"{name:>12}" for name in users))
+    for name, (templates, fragments) in setups.items():
+        with override_settings(TEMPLATES=templates,
+                               CACHES={"default": DUMMY_CACHE, "template_fragments": fragments}):
+            times = [measure(questions, user, args.renders) for user in users.values()]
+        print(f"{name:<15}" + "".join(f"{ms:>12.2f}" for ms in times))
+
+
+if __name__ == "__main__":
+    main()
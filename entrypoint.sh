@@ -1,5 +1,9 @@
 #!/bin/sh
 
 python ./manage.py migrate
-python ./manage.py loaddata data/polls-v4.json data/users.json data/votes-v4.json
-python ./manage.py runserver 0.0.0.0:8000
+python ./manage.py collectstatic --noinput
+python ./manage.py load_fixtures data/polls-v4.json data/users.json data/votes-v4.json
+if [ "$SERVER" = "runserver" ]; then
+    exec python ./manage.py runserver 0.0.0.0:8000
+fi
+exec gunicorn --config gunicorn.conf.py
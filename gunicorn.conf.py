@@ -0,0 +1,51 @@
+"""
+Gunicorn settings of the production server, read from the environment.
+
+The WSGI application is served by threaded workers, or the ASGI one by
+uvicorn workers when ASYNC_VIEWS is set. The application is loaded once
+before the workers are forked; nothing connects to the database at import,
+so every worker opens its own connections or pool.
+
+Several workers only behave as one server when the state they share is
+outside of them. The cached results versions, the poll schedule version
+and the cached session users live in the default cache, so several
+workers need a CACHE_BACKEND they all see, such as the FileBasedCache the
+container is given or Redis. The live results streams (ASYNC_VIEWS) and
+the vote buffer (VOTE_BUFFER_ENABLED) only see votes of their own
+process, so they need a single worker whatever the cache. Unless
+SERVER_WORKERS is set, one worker is started when any of these holds.
+
+    gunicorn            # uses this file from the project directory
+"""
+import multiprocessing
+import decouple
+
+
+ASYNC_VIEWS = decouple.config("ASYNC_VIEWS", cast=bool, default=False)
+VOTE_BUFFER_ENABLED = decouple.config("VOTE_BUFFER_ENABLED", cast=bool, default=False)
+CACHE_BACKEND = decouple.config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache")
+# Backends that keep a separate cache in each process
+PROCESS_CACHES = ("django.core.cache.backends.locmem.LocMemCache",
+                  "django.core.cache.backends.dummy.DummyCache")
+SINGLE_PROCESS = ASYNC_VIEWS or VOTE_BUFFER_ENABLED or CACHE_BACKEND in PROCESS_CACHES
+
+wsgi_app = "mysite.asgi:application" if ASYNC_VIEWS else "mysite.wsgi:application"
+worker_class = "uvicorn_worker.UvicornWorker" if ASYNC_VIEWS else "gthread"
+bind = decouple.config("SERVER_BIND", default="0.0.0.0:8000")
+# Two threaded workers per core, or a single worker, see above
+workers = decouple.config("SERVER_WORKERS", cast=int,
+                          default=1 if SINGLE_PROCESS else multiprocessing.cpu_count() * 2 + 1)
+# Threads of each WSGI worker, keep DB_POOL_MAX_SIZE at least this large
+threads = decouple.config("SERVER_THREADS", cast=int, default=4)
+# Connections a WSGI worker holds while they wait for a thread, and the
+# listen queue beyond them, so an overload is refused instead of queued
+worker_connections = decouple.config("SERVER_MAX_CONNECTIONS", cast=int, default=threads * 8)
+backlog = decouple.config("SERVER_BACKLOG", cast=int, default=256)
+preload_app = True
+# Restart workers now and then to bound memory growth
+max_requests = decouple.config("SERVER_MAX_REQUESTS", cast=int, default=10000)
+max_requests_jitter = max_requests // 10
+timeout = decouple.config("SERVER_TIMEOUT", cast=int, default=30)
+graceful_timeout = timeout
+keepalive = 5
+accesslog = decouple.config("SERVER_ACCESS_LOG", default=None)
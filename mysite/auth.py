@@ -0,0 +1,42 @@
+"""
+Authentication backend that caches the user of each session.
+
+Every authenticated request loads its user by primary key. The backend
+keeps that user in the cache for USER_CACHE_TIMEOUT seconds, and a user is
+dropped from the cache when it is saved or deleted, for example on a
+password change. With the default local memory cache only the process that
+saved the user drops it, so the timeout bounds how long other processes
+may serve a stale copy.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+def user_key(user_id):
+    """Return the cache key of the user with user_id."""
+    return f"auth-user:{user_id}"
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that reads the user of a session through the cache."""
+
+    def get_user(self, user_id):
+        """Return the cached user, loading and caching it on a miss."""
+        if not settings.USER_CACHE_TIMEOUT:
+            return super().get_user(user_id)
+        user = cache.get(user_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(user_key(user_id), user, settings.USER_CACHE_TIMEOUT)
+        return user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_user(sender, instance, **kwargs):
+    """Drop a saved or deleted user from the cache."""
+    cache.delete(user_key(instance.pk))
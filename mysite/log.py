@@ -0,0 +1,100 @@
+"""
+Non-blocking JSON lines logging.
+
+QueueFileHandler only puts records on an in-memory queue, so the request
+thread never waits for the disk. A background listener formats the records
+and appends them to the file, which every server process may share. It is
+rotated outside of the app, for example by logrotate, and reopened once it
+has been moved. Rotating by size from the app is only safe with a single
+process, since each would rotate the shared file on its own and lose or
+mix lines. JsonFormatter writes one JSON
+object per line with the standard fields and any ``extra`` fields given to
+the logger call.
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
+# Attributes every LogRecord has, anything else came from extra.
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as one line of JSON."""
+
+    def format(self, record):
+        """Return the record and its extra fields as a JSON object."""
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "process": record.process,
+            "thread": record.thread,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items()
+                     if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueFileHandler(logging.handlers.QueueHandler):
+    """Queue records for a background thread that writes a log file."""
+
+    def __init__(self, filename, max_bytes=0, backup_count=5, queue_size=10000):
+        """
+        Write to filename, reopened when it is rotated outside of the app.
+
+        With max_bytes the file is instead rotated every max_bytes by this
+        process, keeping backup_count files.
+        """
+        super().__init__(queue.Queue(queue_size))
+        if max_bytes:
+            self.target = logging.handlers.RotatingFileHandler(
+                filename, maxBytes=max_bytes, backupCount=backup_count,
+                encoding="utf-8", delay=True)
+        else:
+            self.target = logging.handlers.WatchedFileHandler(filename, encoding="utf-8", delay=True)
+        self.writer = None
+        self.pid = None
+        self.dropped = 0
+        atexit.register(self.stop)
+
+    def setFormatter(self, fmt):
+        """Format in the listener thread, not when the record is queued."""
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """Queue the record as it is, message and arguments unformatted."""
+        return record
+
+    def enqueue(self, record):
+        """Queue the record, dropping it rather than waiting when full."""
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        """Start the listener, again with a new queue in a forked worker process."""
+        if self.pid is not None:
+            self.queue = queue.Queue(self.queue.maxsize)
+        self.pid = os.getpid()
+        self.writer = logging.handlers.QueueListener(self.queue, self.target)
+        self.writer.start()
+
+    def stop(self):
+        """Write the queued records and stop the listener."""
+        if self.writer is not None and self.pid == os.getpid():
+            self.writer.stop()
+            self.writer = None
+            self.pid = None
+        self.target.close()
@@ -0,0 +1,277 @@
+"""
+Per-request instrumentation and read replica pinning.
+
+When REQUEST_METRICS_ENABLED is set, every request records its number of
+SQL queries, total database time, template render time and wall time,
+tagged by URL name. The numbers are sent back as Server-Timing headers and
+kept in a rolling in-memory summary of the last REQUEST_METRICS_WINDOW
+requests per URL name. When it is not set, the middleware removes itself
+from the stack at startup and costs nothing.
+
+ReplicaPinningMiddleware sends a client's reads to the primary database for
+REPLICA_PIN_SECONDS after it writes, see mysite/routers.py.
+
+LoadSheddingMiddleware answers 503 at once, before sessions or anything
+else touch the database, when a server process already has
+MAX_CONCURRENT_REQUESTS requests in flight.
+"""
+import collections
+import contextvars
+import statistics
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.template.base import Template
+from .routers import PIN_COOKIE
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """The numbers collected for one request."""
+
+    __slots__ = ("queries", "db_time", "template_time", "template_depth")
+
+    def __init__(self):
+        """Start from zero."""
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+
+def count_query(execute, sql, params, many, context):
+    """Database execute wrapper that adds to the metrics of the request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries += 1
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """Add count_query to a database connection unless it is there."""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def timed_render(render):
+    """Wrap Template.render to time the outermost render of a request."""
+    def wrapper(self, context):
+        metrics = _current.get()
+        if metrics is None:
+            return render(self, context)
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - start
+    wrapper.timed = True
+    return wrapper
+
+
+class MetricsSummary:
+    """Rolling samples of the last requests of each URL name."""
+
+    def __init__(self, window):
+        """Keep at most window samples per URL name."""
+        self.window = window
+        self._samples = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def add(self, url_name, wall, metrics):
+        """Record one finished request."""
+        with self._lock:
+            self._samples[url_name].append(
+                (wall, metrics.queries, metrics.db_time, metrics.template_time))
+
+    def clear(self):
+        """Forget every sample."""
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """Return count, mean and p95 of the samples of each URL name."""
+        with self._lock:
+            samples = {name: list(rows) for name, rows in self._samples.items()}
+        result = {}
+        for name, rows in samples.items():
+            walls, queries, db_times, template_times = zip(*rows)
+            result[name] = {
+                "requests": len(rows),
+                "wall_ms_mean": statistics.fmean(walls) * 1000,
+                "wall_ms_p95": sorted(walls)[int(0.95 * (len(walls) - 1))] * 1000,
+                "queries_mean": statistics.fmean(queries),
+                "queries_max": max(queries),
+                "db_ms_mean": statistics.fmean(db_times) * 1000,
+                "template_ms_mean": statistics.fmean(template_times) * 1000,
+            }
+        return result
+
+
+summary = MetricsSummary(window=settings.REQUEST_METRICS_WINDOW)
+
+
+class RequestMetricsMiddleware:
+    """Measure each request and report it in Server-Timing headers."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Install the query counter and template timer, or step aside."""
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_counter,
+                                   dispatch_uid="request_metrics")
+        if not getattr(Template.render, "timed", False):
+            Template.render = timed_render(Template.render)
+
+    def __call__(self, request):
+        """Measure a request served by a sync or async handler."""
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        """Measure a request served by the async handler."""
+        metrics, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def start(self):
+        """Begin collecting metrics for a request."""
+        for alias in connections:
+            install_query_counter(None, connections[alias])
+        metrics = RequestMetrics()
+        return metrics, _current.set(metrics), time.perf_counter()
+
+    def finish(self, request, response, metrics, start):
+        """Add the Server-Timing header and record the request."""
+        wall = time.perf_counter() - start
+        match = request.resolver_match
+        url_name = match.view_name if match else "unresolved"
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+            f"tpl;dur={metrics.template_time * 1000:.2f}",
+            f"total;dur={wall * 1000:.2f}",
+        ])
+        summary.add(url_name, wall, metrics)
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """Pin a client to the primary database for a while after it writes."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Step aside unless there are read replicas."""
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """Pin the client of a sync or async write request."""
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        """Pin the client of an async write request."""
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        """Set the pin cookie on the response to a successful write."""
+        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE") and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite="Lax")
+        return response
+
+
+class LoadSheddingMiddleware:
+    """Shed requests beyond MAX_CONCURRENT_REQUESTS in flight per process."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Step aside unless MAX_CONCURRENT_REQUESTS is set."""
+        if not settings.MAX_CONCURRENT_REQUESTS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limit = settings.MAX_CONCURRENT_REQUESTS
+        self.in_flight = 0
+        self.shed = 0
+        self.lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """Handle a sync request if there is room for it."""
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enter():
+            return self.overloaded()
+        try:
+            return self.get_response(request)
+        finally:
+            self.leave()
+
+    async def __acall__(self, request):
+        """Handle an async request if there is room for it."""
+        if not self.enter():
+            return self.overloaded()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.leave()
+
+    def enter(self):
+        """Count a request in, return False if the process is full."""
+        with self.lock:
+            if self.in_flight >= self.limit:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        """Count a finished request out."""
+        with self.lock:
+            self.in_flight -= 1
+
+    def overloaded(self):
+        """Return the 503 response of a shed request."""
+        response = HttpResponse("The server is busy, try again shortly.\n", status=503,
+                                content_type="text/plain")
+        response["Retry-After"] = "1"
+        return response
@@ -0,0 +1,149 @@
+"""
+In-process rate limits of the vote, login and signup views.
+
+Each scope of RATE_LIMITS limits requests by client IP and by user with
+token buckets held in memory by every server process. A bucket is a pair
+of numbers in an ordered dict that forgets the least recently seen keys
+beyond RATE_LIMIT_MAX_KEYS, so a storm of addresses cannot grow it without
+bound. The IP is checked first, so a flood from one address is answered
+429 before the session, the user or anything else is read from the
+database.
+"""
+import collections
+import functools
+import logging
+import math
+import threading
+import time
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+
+logger = logging.getLogger("polls")
+
+PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+
+def get_client_ip(request):
+    """
+    Get the visitor’s IP address using request headers.
+
+    X-Forwarded-For is only read behind TRUSTED_PROXY_COUNT proxies, each of
+    which appends the address it was connected from, so the client is the
+    entry that many places from the right. Entries left of it are set by
+    the client, who could otherwise take a new rate limit bucket with each
+    request.
+    """
+    proxies = settings.TRUSTED_PROXY_COUNT
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and x_forwarded_for:
+        hops = [hop.strip() for hop in x_forwarded_for.split(',')]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def parse_rate(rate):
+    """Return the (requests, seconds) of a rate such as "30/m"."""
+    count, _, period = rate.partition("/")
+    return int(count), PERIODS[period]
+
+
+class TokenBuckets:
+    """Token buckets of many keys, refilled at count tokens per period."""
+
+    def __init__(self, rate, max_keys):
+        """Hold at most max_keys buckets of the given rate."""
+        self.capacity, period = parse_rate(rate)
+        self.refill = self.capacity / period
+        self.max_keys = max_keys
+        self.buckets = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, now=None):
+        """Take a token of key, return 0 or the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, stamp = self.buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - stamp) * self.refill)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.refill
+            self.buckets[key] = (tokens - 1 if not wait else tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+# Buckets of each scope and key kind, made when first used
+buckets = {}
+
+
+def take(scope, kind, key):
+    """Take a token of key from the buckets of scope and kind, if limited."""
+    rate = settings.RATE_LIMITS.get(scope, {}).get(kind)
+    if not rate or key is None:
+        return 0.0
+    limiter = buckets.get((scope, kind, rate))
+    if limiter is None:
+        limiter = buckets.setdefault((scope, kind, rate),
+                                     TokenBuckets(rate, settings.RATE_LIMIT_MAX_KEYS))
+    return limiter.take(key)
+
+
+def user_key(request, user):
+    """Return the key of the user, or of the username being logged in."""
+    if user.is_authenticated:
+        return f"id:{user.pk}"
+    username = request.POST.get("username")
+    return f"name:{username.lower()}" if username else None
+
+
+def too_many_requests(request, scope, wait):
+    """Return the 429 response of a limited request."""
+    ip = get_client_ip(request)
+    logger.warning("%s request from %s was rate limited", scope, ip,
+                   extra={"event": "rate_limited", "scope": scope, "ip": ip})
+    response = HttpResponse("Too many requests, try again later.\n", status=429,
+                            content_type="text/plain")
+    response["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+def limits_users(scope):
+    """Return True if scope limits requests per user."""
+    return bool(settings.RATE_LIMITS.get(scope, {}).get("user"))
+
+
+def ip_wait(scope, request, methods):
+    """Take a token of the client IP, return None if the request is not counted."""
+    if not settings.RATE_LIMITS_ENABLED or request.method not in methods:
+        return None
+    return take(scope, "ip", get_client_ip(request))
+
+
+def rate_limit(scope, methods=("POST",)):
+    """
+    Decorate a sync or async view to answer 429 to requests over the limits.
+
+    Only requests with one of methods are counted. The user is only loaded
+    when the client IP is within its limit and the scope limits users.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            async def wrapper(request, *args, **kwargs):
+                wait = ip_wait(scope, request, methods)
+                if wait == 0 and limits_users(scope):
+                    wait = take(scope, "user", user_key(request, await request.auser()))
+                if wait:
+                    return too_many_requests(request, scope, wait)
+                return await view(request, *args, **kwargs)
+        else:
+            def wrapper(request, *args, **kwargs):
+                wait = ip_wait(scope, request, methods)
+                if wait == 0 and limits_users(scope):
+                    wait = take(scope, "user", user_key(request, request.user))
+                if wait:
+                    return too_many_requests(request, scope, wait)
+                return view(request, *args, **kwargs)
+        return functools.wraps(view)(wrapper)
+    return decorator
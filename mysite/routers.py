@@ -0,0 +1,81 @@
+"""
+Send the reads of selected views to read replicas.
+
+Reads go to a replica only inside views decorated with read_from_replica,
+and only for the models of REPLICA_APPS, so sessions, users and every write
+stay on the primary. A client that has just written something carries the
+pin cookie set by ReplicaPinningMiddleware and reads from the primary
+until it expires, so it always sees its own vote.
+"""
+import contextlib
+import contextvars
+import functools
+import random
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+
+PIN_COOKIE = "primary_pin"
+REPLICA_APPS = {"polls"}
+
+_replica_reads = contextvars.ContextVar("replica_reads", default=False)
+
+
+def pick_replica():
+    """Return the alias of a replica to read from."""
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def reading_from_replica():
+    """Return True if the current view may read from a replica."""
+    return _replica_reads.get() and bool(settings.DATABASE_REPLICAS)
+
+
+def is_pinned(request):
+    """Return True if the client has written recently and reads from the primary."""
+    return PIN_COOKIE in request.COOKIES
+
+
+@contextlib.contextmanager
+def replica_reads(request):
+    """Allow replica reads in the block unless the client is pinned."""
+    token = _replica_reads.set(not is_pinned(request))
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_from_replica(view):
+    """Decorate a sync or async view so its reads may go to a replica."""
+    if iscoroutinefunction(view):
+        async def wrapper(request, *args, **kwargs):
+            with replica_reads(request):
+                return await view(request, *args, **kwargs)
+    else:
+        def wrapper(request, *args, **kwargs):
+            with replica_reads(request):
+                return view(request, *args, **kwargs)
+    return functools.wraps(view)(wrapper)
+
+
+class ReplicaRouter:
+    """Route the reads of replica enabled views and keep the rest on default."""
+
+    def db_for_read(self, model, **hints):
+        """Return a replica inside read_from_replica views, else no opinion."""
+        if model._meta.app_label in REPLICA_APPS and reading_from_replica():
+            return pick_replica()
+        return None
+
+    def db_for_write(self, model, **hints):
+        """Write everything to the primary."""
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Allow relations between rows of the primary and its replicas."""
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Migrate only the primary, the replicas copy its schema."""
+        return db not in settings.DATABASE_REPLICAS
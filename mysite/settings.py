@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+from urllib.parse import urlsplit
 from decouple import config, Csv
 from django.core.management.utils import get_random_secret_key
 
@@ -45,7 +46,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mysite.middleware.RequestMetricsMiddleware',
+    'mysite.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'mysite.middleware.LoadSheddingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,8 +65,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process, reloaded on change when DEBUG
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -73,20 +84,63 @@ TEMPLATES = [
 ]
 
 AUTHENTICATION_BACKENDS = [
-   'django.contrib.auth.backends.ModelBackend',
+   'mysite.auth.CachedModelBackend',
 ]
 
+# Seconds the user of a session is kept in the cache, 0 to load it each request
+USER_CACHE_TIMEOUT = config('USER_CACHE_TIMEOUT', cast=int, default=60)
+
+# Where sessions are kept: "db", "cached_db" or "cache", which need a
+# CACHE_BACKEND shared by all server processes to be read through the cache,
+# or "signed_cookies", which keeps them in the client and needs no storage
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + config(
+    'SESSION_STORE', default='db')
+
+# Flash messages travel in a cookie, so setting one never writes the session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Query count and timing of each request, see mysite/middleware.py
+REQUEST_METRICS_ENABLED = config("REQUEST_METRICS_ENABLED", cast=bool, default=False)
+REQUEST_METRICS_WINDOW = config("REQUEST_METRICS_WINDOW", cast=int, default=1000)
+
+# Token bucket limits of each rate limited view, by client IP and by user
+# (the username being logged in for login), as requests/s, /m or /h. Each
+# server process keeps its own buckets, see mysite/ratelimit.py.
+RATE_LIMITS_ENABLED = config("RATE_LIMITS_ENABLED", cast=bool, default=True)
+RATE_LIMITS = {
+    "vote": {"ip": config("RATE_LIMIT_VOTE_IP", default="300/m"),
+             "user": config("RATE_LIMIT_VOTE_USER", default="30/m")},
+    "login": {"ip": config("RATE_LIMIT_LOGIN_IP", default="60/m"),
+              "user": config("RATE_LIMIT_LOGIN_USER", default="10/m")},
+    "signup": {"ip": config("RATE_LIMIT_SIGNUP_IP", default="10/h")},
+    "ballot": {"ip": config("RATE_LIMIT_BALLOT_IP", default="120/m"),
+               "user": config("RATE_LIMIT_BALLOT_USER", default="10/m")},
+}
+RATE_LIMIT_MAX_KEYS = config("RATE_LIMIT_MAX_KEYS", cast=int, default=100000)
+# Reverse proxies in front of the server that append to X-Forwarded-For, 0
+# to ignore the header and use the address of the connection
+TRUSTED_PROXY_COUNT = config("TRUSTED_PROXY_COUNT", cast=int, default=0)
+
+# Requests a server process handles at once before it answers 503, 0 for
+# no limit. Mostly useful with ASYNC_VIEWS, where nothing else bounds it.
+MAX_CONCURRENT_REQUESTS = config("MAX_CONCURRENT_REQUESTS", cast=int, default=0)
+
 LOGIN_REDIRECT_URL = 'polls:index'
 LOGOUT_REDIRECT_URL = 'login'
 
+# The polls logger writes JSON lines from a background thread, see mysite/log.py.
+# Leave LOG_MAX_BYTES at 0 and rotate the file with logrotate when several
+# server processes share it; size rotation is for a single process only.
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
     "handlers": {
         "file": {
-            "class": "logging.FileHandler",
-            "filename": "polls.log",
-            "formatter": "verbose",
+            "()": "mysite.log.QueueFileHandler",
+            "filename": config("LOG_FILE", default="polls.log"),
+            "max_bytes": config("LOG_MAX_BYTES", cast=int, default=0),
+            "backup_count": config("LOG_BACKUP_COUNT", cast=int, default=5),
+            "formatter": "json",
         },
         "console": {
             "class": "logging.StreamHandler",
@@ -106,6 +160,9 @@ LOGGING = {
         },
     },
     "formatters": {
+        "json": {
+            "()": "mysite.log.JsonFormatter",
+        },
         "verbose": {
             "format": "{levelname}: {name} {asctime} {module} {process:d} {thread:d} -> {message}",
             "style": "{",
@@ -119,6 +176,13 @@ LOGGING = {
 
 WSGI_APPLICATION = 'mysite.wsgi.application'
 
+# Serve the async detail, results and vote views, for running under ASGI
+ASYNC_VIEWS = config("ASYNC_VIEWS", cast=bool, default=False)
+
+# Live results streams (async views only), see polls/broker.py
+RESULTS_STREAM_INTERVAL_MS = config("RESULTS_STREAM_INTERVAL_MS", cast=int, default=500)
+RESULTS_STREAM_KEEPALIVE = config("RESULTS_STREAM_KEEPALIVE", cast=int, default=15)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -130,10 +194,102 @@ DATABASES = {
         "USER": config("DB_USER", default="pollsapp"),
         "PASSWORD": config("DB_PASSWORD", default="password"),
         "HOST": config("DB_HOST", default="localhost"),
-        "PORT": config("DB_PORT", default="5432")
+        "PORT": config("DB_PORT", default="5432"),
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", cast=int, default=0),
+        "CONN_HEALTH_CHECKS": True,
+    }
+}
+
+# Pool the connections of each server process with psycopg_pool. With
+# CONN_HEALTH_CHECKS the pool checks a connection before handing it out.
+if config("DB_POOL", cast=bool, default=False):
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {"pool": {
+        "min_size": config("DB_POOL_MIN_SIZE", cast=int, default=2),
+        "max_size": config("DB_POOL_MAX_SIZE", cast=int, default=10),
+        "timeout": config("DB_POOL_TIMEOUT", cast=float, default=10),
+        "max_idle": config("DB_POOL_MAX_IDLE", cast=float, default=600),
+    }}
+
+# Read replicas of the default database, as host[:port][/name] separated by
+# commas. Index, results and admin list reads go to them, see mysite/routers.py
+DATABASE_REPLICAS = []
+for number, replica in enumerate(config("DB_REPLICAS", cast=Csv(), default=""), start=1):
+    replica = urlsplit(f"//{replica}")
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": replica.hostname,
+        "PORT": str(replica.port or DATABASES["default"]["PORT"]),
+        "NAME": replica.path.lstrip("/") or DATABASES["default"]["NAME"],
+        "TEST": {"MIRROR": "default"},
     }
+    DATABASE_REPLICAS.append(f"replica{number}")
+
+DATABASE_ROUTERS = ["mysite.routers.ReplicaRouter"]
+
+# Seconds a client reads from the primary after it writes
+REPLICA_PIN_SECONDS = config("REPLICA_PIN_SECONDS", cast=int, default=5)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND",
+                          default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="ku-polls"),
+    },
+    # Rendered header and question card fragments. Their keys cover all they
+    # show, so a cache in each process is never stale and needs no network.
+    "template_fragments": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "template-fragments",
+        "OPTIONS": {
+            "MAX_ENTRIES": config("FRAGMENT_CACHE_MAX_ENTRIES", cast=int, default=10000),
+        },
+    },
 }
 
+RESULTS_CACHE_ALIAS = "default"
+RESULTS_CACHE_TIMEOUT = config("RESULTS_CACHE_TIMEOUT", cast=int, default=300)
+
+
+# Rows read from the database and written to the response at a time by the
+# streaming exports, see polls/export.py
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", cast=int, default=2000)
+
+# Seconds a vote is given to commit before refresh_rollup counts it, and
+# the hours of vote history the history endpoint returns at most
+ROLLUP_LAG = config("ROLLUP_LAG", cast=int, default=60)
+HISTORY_MAX_HOURS = config("HISTORY_MAX_HOURS", cast=int, default=24 * 90)
+
+# Seconds a process uses its poll schedule at most before it reloads it, so
+# questions changed in another process are seen without a shared cache, see
+# polls/schedule.py
+SCHEDULE_MAX_AGE = config("SCHEDULE_MAX_AGE", cast=int, default=5)
+
+# Votes accepted at most in one ballot, see polls.views.ballot
+BALLOT_MAX_VOTES = config("BALLOT_MAX_VOTES", cast=int, default=100)
+
+# Admin change lists of whole tables with at least this many rows show the
+# planner's row estimate instead of running COUNT(*), see polls/admin.py
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config("ADMIN_ESTIMATED_COUNT_THRESHOLD", cast=int, default=100000)
+
+
+# Buffered vote ingestion, see polls/ingest.py
+
+VOTE_BUFFER_ENABLED = config("VOTE_BUFFER_ENABLED", cast=bool, default=False)
+VOTE_BUFFER_MAX_SIZE = config("VOTE_BUFFER_MAX_SIZE", cast=int, default=10000)
+VOTE_BUFFER_BATCH_SIZE = config("VOTE_BUFFER_BATCH_SIZE", cast=int, default=500)
+VOTE_BUFFER_FLUSH_MS = config("VOTE_BUFFER_FLUSH_MS", cast=int, default=50)
+VOTE_BUFFER_PUT_TIMEOUT_MS = config("VOTE_BUFFER_PUT_TIMEOUT_MS", cast=int, default=100)
+VOTE_BUFFER_WAIT_TIMEOUT_MS = config("VOTE_BUFFER_WAIT_TIMEOUT_MS", cast=int, default=2000)
+# Tries of a failed batch write, the first retry waits VOTE_BUFFER_RETRY_MS
+# and each later one twice as long as the one before
+VOTE_BUFFER_WRITE_ATTEMPTS = config("VOTE_BUFFER_WRITE_ATTEMPTS", cast=int, default=3)
+VOTE_BUFFER_RETRY_MS = config("VOTE_BUFFER_RETRY_MS", cast=int, default=100)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -173,6 +329,22 @@ STATIC_URL = 'static/'
 
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Hashed, gzip and brotli compressed copies, served by WhiteNoiseMiddleware,
+# see mysite/storage.py
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "mysite.storage.StaticFilesStorage",
+    },
+}
+
+# Cache-Control max-age of static files without a hash in their name
+WHITENOISE_MAX_AGE = config("STATIC_MAX_AGE", cast=int, default=3600)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,26 @@
+"""
+Static files storage that serves hashed, precompressed files.
+
+collectstatic gives every file a content hashed name and writes gzip and
+brotli copies next to it, which WhiteNoiseMiddleware serves by the client's
+Accept-Encoding with a far-future, immutable Cache-Control header.
+"""
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Hashed and compressed static files, unhashed until collected."""
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        """
+        Return the hashed name of a collected file, else the name itself.
+
+        Tests and the development server use the files before collectstatic
+        has run, and the finders serve them under their own names.
+        """
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
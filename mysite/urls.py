@@ -26,4 +26,5 @@ urlpatterns = [
     path('accounts/login/', views.Login.as_view(), name='login'),
     path('signup/', views.signup, name='signup'),
     path('logout/', views.logout_handler, name='logout'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -1,31 +1,29 @@
 """Store redirect, signup, login and logout view."""
 import logging
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import JsonResponse
 from django.views import generic
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.views import LoginView
+from django.utils.decorators import method_decorator
+from polls.cache import results_cache_stats
+from .middleware import summary
+from .ratelimit import get_client_ip, rate_limit
 
 
 logger = logging.getLogger("polls")
 
 
-def get_client_ip(request):
-    """Get the visitor’s IP address using request headers."""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
-
-
 class RedirectIndexView(generic.RedirectView):
     """Use to redirect the '/' url to index page."""
 
     url = "polls/"
 
 
+@method_decorator(rate_limit("login"), name="dispatch")
 class Login(LoginView):
     """Custom login view by adding logger."""
 
@@ -34,17 +32,20 @@ class Login(LoginView):
         response = super().form_valid(form)
         ip = get_client_ip(self.request)
         user = self.request.user
-        logger.info(f"{user.username} logged in from {ip}")
+        logger.info("%s logged in from %s", user.username, ip,
+                    extra={"event": "login", "user": user.username, "ip": ip})
         return response
 
     def form_invalid(self, form):
         """Nothing change but add logger."""
         ip = get_client_ip(self.request)
-        logger.warning(f"{self.request.POST.get('username')} "
-                       f"failed to login from {ip}")
+        username = self.request.POST.get("username")
+        logger.warning("%s failed to login from %s", username, ip,
+                       extra={"event": "login_failed", "user": username, "ip": ip})
         return super().form_invalid(form)
 
 
+@rate_limit("signup")
 def signup(request):
     """Register a new user."""
     if request.method == "POST":
@@ -53,10 +54,12 @@ def signup(request):
         if form.is_valid():
             user = form.save()
             login(request, user)
-            logger.info(f"{user.username} signed up and logged in from {ip}")
+            logger.info("%s signed up and logged in from %s", user.username, ip,
+                        extra={"event": "signup", "user": user.username, "ip": ip})
             return redirect("polls:index")
-        logger.warning(f"{request.POST.get('username')} "
-                       f"failed to sign up from {ip}")
+        username = request.POST.get("username")
+        logger.warning("%s failed to sign up from %s", username, ip,
+                       extra={"event": "signup_failed", "user": username, "ip": ip})
     else:
         form = UserCreationForm()
     return render(request, "registration/signup.html", {"form": form})
@@ -66,6 +69,27 @@ def logout_handler(request):
     """Log out and redirect to index."""
     user = request.user
     ip = get_client_ip(request)
-    logger.info(f"{user.username} logged out from {ip}")
+    logger.info("%s logged out from %s", user.username, ip,
+                extra={"event": "logout", "user": user.username, "ip": ip})
     logout(request)
     return redirect("polls:index")
+
+
+def database_pool_stats():
+    """Return the statistics of the connection pool of each database."""
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+@staff_member_required
+def metrics(request):
+    """Show the request metrics, cache counters and pool statistics of this process."""
+    return JsonResponse({
+        "requests": summary.summary(),
+        "results_cache": results_cache_stats(),
+        "database_pools": database_pool_stats(),
+    })
@@ -1,6 +1,15 @@
 """Contains admin views related."""
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from mysite.routers import replica_reads
 from .models import Question, Choice, Vote
+from .schedule import current_schedule
+from .voting import recount_votes, results_changed, touch_questions
 
 
 class ChoiceInline(admin.TabularInline):
@@ -10,7 +19,100 @@ class ChoiceInline(admin.TabularInline):
     extra = 0
 
 
-class QuestionAdmin(admin.ModelAdmin):
+def estimated_count(queryset):
+    """Return PostgreSQL's estimate of the rows in queryset's table, or None."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                       [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    # reltuples is -1 until the table is first vacuumed or analyzed
+    return int(row[0]) if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Count a large unfiltered change list from the table statistics."""
+
+    @cached_property
+    def count(self):
+        """Return the estimated rows of a large table, else the exact count."""
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    Filter on a foreign key with a search box instead of a list of links.
+
+    Only the selected object is read, the others are searched through the
+    admin's autocomplete view, so the sidebar stays small however many users
+    or questions there are. The related admin needs search_fields.
+    """
+
+    template = "admin/polls/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        """Keep the admin site, whose autocomplete view does the searches."""
+        self.admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        """Load no choices, they are searched as the user types."""
+        return []
+
+    def has_output(self):
+        """Show the search box even though no choices are loaded."""
+        return True
+
+    def widget(self):
+        """Render the autocomplete select with the selected object."""
+        formfield = self.field.formfield(
+            required=False, widget=AutocompleteSelect(self.field, self.admin_site))
+        value = self.lookup_val[-1] if self.lookup_val else None
+        return formfield.widget.render(self.lookup_kwarg, value, attrs={
+            "class": "admin-autocomplete-filter", "data-width": "100%"})
+
+    @staticmethod
+    def media():
+        """Return the scripts and styles the filter needs."""
+        return AutocompleteSelect(None, admin.site).media + \
+            forms.Media(js=["polls/autocomplete_filter.js"])
+
+
+class ReplicaListAdmin(admin.ModelAdmin):
+    """
+    Read the change list pages from a replica and keep them cheap on big tables.
+
+    Large tables are counted from their statistics, the total count and the
+    facet counts are not computed, and autocomplete filters add their media.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    @property
+    def media(self):
+        """Add the media of autocomplete filters, if any."""
+        if any(isinstance(spec, tuple) and issubclass(spec[1], AutocompleteFilter)
+               for spec in self.list_filter):
+            return super().media + AutocompleteFilter.media()
+        return super().media
+
+    def changelist_view(self, request, extra_context=None):
+        """Show the change list, reading it from a replica unless it is a POST."""
+        if request.method == "POST":
+            return super().changelist_view(request, extra_context)
+        with replica_reads(request):
+            return super().changelist_view(request, extra_context)
+
+
+class QuestionAdmin(ReplicaListAdmin):
     """Admin can access and manage Question model."""
 
     fieldsets = [
@@ -23,22 +125,94 @@ class QuestionAdmin(admin.ModelAdmin):
     list_filter = ["published_date"]
     search_fields = ["question_text"]
 
+    @admin.display(boolean=True, description="Published yet?")
+    def is_published(self, obj):
+        """Look the question up in the poll schedule."""
+        return current_schedule().is_published(obj.pk)
 
-class ChoiceAdmin(admin.ModelAdmin):
+    @admin.display(boolean=True, description="Can vote?")
+    def can_vote(self, obj):
+        """Look the question up in the poll schedule."""
+        return current_schedule().is_open(obj.pk)
+
+    def save_related(self, request, form, formsets, change):
+        """Save the choices and refresh the cached and live results."""
+        super().save_related(request, form, formsets, change)
+        results_changed([form.instance.pk])
+
+
+class ChoiceAdmin(ReplicaListAdmin):
     """Admin can access and manage Choice model."""
 
     list_display = ["__str__", "votes", "question"]
-    list_filter = ["question"]
+    list_select_related = ["question"]
+    list_filter = [("question", AutocompleteFilter)]
+    search_fields = ["choice_text"]
+    autocomplete_fields = ["question"]
+
+    @admin.display(description="Votes", ordering="vote_count")
+    def votes(self, obj):
+        """Return the stored vote count, sortable in the change list."""
+        return obj.vote_count
 
+    def save_model(self, request, obj, form, change):
+        """Save the choice and refresh the cached and live results."""
+        super().save_model(request, obj, form, change)
+        touch_questions([obj.question_id])
+        results_changed([obj.question_id])
 
-class VoteAdmin(admin.ModelAdmin):
+    def delete_model(self, request, obj):
+        """Delete the choice and refresh the cached and live results."""
+        super().delete_model(request, obj)
+        touch_questions([obj.question_id])
+        results_changed([obj.question_id])
+
+    def delete_queryset(self, request, queryset):
+        """Delete the choices and refresh the results of their questions."""
+        question_ids = set(queryset.values_list("question_id", flat=True))
+        super().delete_queryset(request, queryset)
+        touch_questions(question_ids)
+        results_changed(question_ids)
+
+
+class VoteAdminForm(forms.ModelForm):
+    """Vote form that checks the one vote per user per question constraint."""
+
+    def clean(self):
+        """Take the question from the choice and refuse a second vote on it."""
+        cleaned_data = super().clean()
+        user, choice = cleaned_data.get("user"), cleaned_data.get("choice")
+        if user is not None and choice is not None:
+            self.instance.question_id = choice.question_id
+            others = Vote.objects.filter(user=user, question_id=choice.question_id)
+            if self.instance.pk is not None:
+                others = others.exclude(pk=self.instance.pk)
+            if others.exists():
+                self.add_error("choice", forms.ValidationError(
+                    "%(user)s already voted on this question.", code="unique_vote_per_user_question",
+                    params={"user": user}))
+        return cleaned_data
+
+
+class VoteAdmin(ReplicaListAdmin):
     """Admin can access and manage Vote model."""
 
+    form = VoteAdminForm
     fieldsets = [
         ("Vote information", {"fields": ["user", "choice"]}),
     ]
-    list_display = ["choice", "user", "question"]
-    list_filter = ["user", "choice"]
+    list_display = ["choice", "user", "question", "voted_at"]
+    list_select_related = ["choice", "user", "question"]
+    list_filter = [("question", AutocompleteFilter), ("user", AutocompleteFilter)]
+    autocomplete_fields = ["user", "choice"]
+
+    def save_model(self, request, obj, form, change):
+        """Save the vote and recount the choices it moved between."""
+        choice_ids = {obj.choice_id}
+        if change and "choice" in form.changed_data:
+            choice_ids.add(form.initial["choice"])
+        super().save_model(request, obj, form, change)
+        recount_votes(Choice.objects.filter(pk__in=choice_ids))
 
 
 admin.site.register(Question, QuestionAdmin)
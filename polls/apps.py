@@ -1,6 +1,14 @@
+"""Configure the polls app."""
 from django.apps import AppConfig
 
 
 class PollsConfig(AppConfig):
+    """Polls app configuration."""
+
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'polls'
+
+    def ready(self):
+        """Connect the signals that drop changed users and schedules and count deleted votes."""
+        from mysite import auth  # noqa: F401
+        from . import schedule, voting  # noqa: F401
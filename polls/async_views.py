@@ -0,0 +1,146 @@
+"""
+Async versions of the detail, results and vote views.
+
+They are served instead of the sync views in polls/views.py when
+ASYNC_VIEWS is set, which avoids a thread hop per request under ASGI.
+The sync views stay the default and are the fallback under WSGI.
+"""
+import asyncio
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db.models import aprefetch_related_objects
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.urls import reverse
+from mysite.ratelimit import rate_limit
+from mysite.routers import read_from_replica
+from .broker import broker, load_counts
+from .cache import aget_results, aresults_version, aset_results
+from .conditional import is_conditional, not_modified, page_etag, set_validators
+from .ingest import accept_vote, await_pending
+from .models import Question, Choice
+from .schedule import acurrent_schedule
+from .views import (cached_results_allowed, detail_queryset, question_last_modified,
+                    replica_timeout, results_queryset, voted_choice)
+
+
+logger = logging.getLogger("polls")
+
+
+async def load_user(request):
+    """
+    Resolve the user of the request in async code.
+
+    The resolved user replaces the lazy request.user, so templates that
+    read it do not run a sync query inside the event loop.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+@rate_limit("vote")
+@login_required
+async def vote(request, question_id):
+    """Vote for a choice on a question (poll)."""
+    user = await load_user(request)
+    try:
+        selected_choice = await Choice.objects.select_related("question").\
+            aget(pk=request.POST['choice'], question_id=question_id)
+    except (KeyError, ValueError, Choice.DoesNotExist):
+        question = await aget_object_or_404(
+            Question.objects.prefetch_related("choice_set"), pk=question_id)
+        messages.error(request, "You didn't select a choice.")
+        logger.error("%s didn't select a choice.", user.username,
+                     extra={"event": "no_choice", "user": user.username, "question": question_id})
+        return render(request, "polls/detail.html", {
+            "question": question})
+    await sync_to_async(accept_vote)(user, selected_choice)
+    messages.info(request,
+                  f"Your vote for "
+                  f"{selected_choice.choice_text} has been recorded")
+    logger.info("%s vote for %s has been recorded", user.username, selected_choice.choice_text,
+                extra={"event": "vote", "user": user.username, "question": question_id,
+                       "choice": selected_choice.id})
+    return HttpResponseRedirect(reverse('polls:results', args=(question_id,)))
+
+
+async def check_valid_question(request, pk):
+    """Show the question and its choices if it is open for voting."""
+    user = await load_user(request)
+    await await_pending(user, pk)
+    try:
+        question = await aget_object_or_404(detail_queryset(user), pk=pk)
+    except Http404:
+        messages.error(request, "The question doesn't exist")
+        logger.error("%s try to access question that does not exist", user.username,
+                     extra={"event": "question_missing", "user": user.username, "question": pk})
+        return redirect(reverse('polls:index'))
+    if not (await acurrent_schedule()).is_open(question.pk):
+        messages.error(request, "Voting is not allowed for this question.")
+        logger.error("%s try to access unavailable question", user.username,
+                     extra={"event": "question_closed", "user": user.username, "question": pk})
+        return redirect(reverse('polls:index'))
+    await aprefetch_related_objects([question], "choice_set")
+    return render(request, "polls/detail.html", {
+        "question": question, "user_vote": voted_choice(question)})
+
+
+@read_from_replica
+async def results(request, pk):
+    """Show the question text and all vote count of each choice."""
+    user = await load_user(request)
+    await await_pending(user, pk)
+    version = await aresults_version(pk)
+    question = await aget_results(pk, version) if cached_results_allowed(request) else None
+    if question is None and not is_conditional(request):
+        question = await aload_results(pk, version)
+    last_modified = question.last_modified if question is not None else \
+        await sync_to_async(question_last_modified)(pk)
+    etag = page_etag(request, "results", pk, last_modified.timestamp(), "live")
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    if question is None:
+        question = await aload_results(pk, version)
+        last_modified = question.last_modified
+        etag = page_etag(request, "results", pk, last_modified.timestamp(), "live")
+    response = render(request, "polls/results.html", {
+        "question": question, "live_results": True})
+    return set_validators(request, response, etag, last_modified)
+
+
+async def aload_results(pk, version):
+    """Load the results of a question and cache them under version."""
+    question = await aget_object_or_404(results_queryset(), pk=pk)
+    await aset_results(pk, version, question, replica_timeout())
+    return question
+
+
+async def results_stream(request, pk):
+    """Stream the vote counts of a question as Server-Sent Events."""
+    await aget_object_or_404(Question, pk=pk)
+    keepalive = settings.RESULTS_STREAM_KEEPALIVE
+
+    async def events():
+        async with broker.subscribe(pk) as subscription:
+            counts = await load_counts(pk)
+            while True:
+                if counts is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: results\ndata: {json.dumps(counts)}\n\n"
+                try:
+                    counts = await asyncio.wait_for(subscription.get(),
+                                                    timeout=keepalive)
+                except asyncio.TimeoutError:
+                    counts = None
+
+    response = StreamingHttpResponse(events(),
+                                     content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,133 @@
+"""
+In-process broker that pushes live results to Server-Sent Events streams.
+
+Every question with subscribers has one channel with one fan-out task on
+the event loop. When votes on the question change, the channel loads the
+counts once and hands them to all of its subscribers, so the number of
+queries does not grow with the number of open streams. Bursts of votes are
+coalesced into at most one update per RESULTS_STREAM_INTERVAL_MS.
+
+Only votes recorded in this process are seen, so every worker process
+serving streams must also serve the votes, as with a single ASGI worker.
+"""
+import asyncio
+import contextlib
+import logging
+import threading
+from django.conf import settings
+from .models import Choice
+
+
+logger = logging.getLogger("polls")
+
+
+async def load_counts(question_id):
+    """Return the vote counts of a question as a JSON-ready dict."""
+    choices = [choice async for choice in Choice.objects.
+               filter(question_id=question_id).order_by("pk").
+               values("id", "vote_count")]
+    total = sum(choice["vote_count"] for choice in choices)
+    return {
+        "question": question_id,
+        "total_votes": total,
+        "choices": [{
+            "id": choice["id"],
+            "votes": choice["vote_count"],
+            "percentage": choice["vote_count"] * 100 / total if total else 0.0,
+        } for choice in choices],
+    }
+
+
+class Subscription:
+    """The stream of one subscriber, only the latest counts are kept."""
+
+    def __init__(self):
+        """Start without any counts."""
+        self._latest = None
+        self._ready = asyncio.Event()
+
+    def put(self, counts):
+        """Replace the counts that were not read yet."""
+        self._latest = counts
+        self._ready.set()
+
+    async def get(self):
+        """Wait for counts newer than the last ones read."""
+        await self._ready.wait()
+        self._ready.clear()
+        return self._latest
+
+
+class Channel:
+    """The subscribers of one question and their shared fan-out task."""
+
+    def __init__(self, question_id, loop):
+        """Create an empty channel on loop."""
+        self.question_id = question_id
+        self.loop = loop
+        self.subscribers = set()
+        self.changed = asyncio.Event()
+        self.task = None
+
+    async def fan_out(self):
+        """
+        Load the counts once per change and give them to every subscriber.
+
+        Counts that fail to load, for example on a dropped database
+        connection, are logged and loaded again after the interval, so the
+        channel keeps serving its subscribers.
+        """
+        interval = settings.RESULTS_STREAM_INTERVAL_MS / 1000
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            try:
+                counts = await load_counts(self.question_id)
+            except Exception:
+                logger.exception("Loading the counts of question %s failed, retrying",
+                                 self.question_id)
+                self.changed.set()
+            else:
+                for subscription in self.subscribers:
+                    subscription.put(counts)
+            await asyncio.sleep(interval)
+
+
+class ResultsBroker:
+    """Keep one channel per watched question and route changes to it."""
+
+    def __init__(self):
+        """Start without channels."""
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, question_id):
+        """Subscribe to the counts of a question for the block."""
+        subscription = Subscription()
+        with self._lock:
+            channel = self._channels.get(question_id)
+            if channel is None:
+                channel = Channel(question_id, asyncio.get_running_loop())
+                self._channels[question_id] = channel
+            channel.subscribers.add(subscription)
+        if channel.task is None:
+            channel.task = asyncio.create_task(channel.fan_out())
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                channel.subscribers.discard(subscription)
+                if not channel.subscribers:
+                    del self._channels[question_id]
+                    channel.task.cancel()
+
+    def notify(self, question_id):
+        """Tell the subscribers of a question that its votes changed."""
+        with self._lock:
+            channel = self._channels.get(question_id)
+        if channel is not None and not channel.loop.is_closed():
+            channel.loop.call_soon_threadsafe(channel.changed.set)
+
+
+broker = ResultsBroker()
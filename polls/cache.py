@@ -0,0 +1,116 @@
+"""
+Versioned cache of the results of each question.
+
+Cached results are keyed by question id and a per-question version number.
+Recording a vote bumps the version, so older entries are never read again
+and simply expire. Hit and miss counters are kept per process.
+"""
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+
+VERSION_KEY = "polls:results:version:{}"
+RESULTS_KEY = "polls:results:{}"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _cache():
+    """Return the cache that stores the results."""
+    return caches[settings.RESULTS_CACHE_ALIAS]
+
+
+def _count(name):
+    """Increment one of the hit and miss counters."""
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def results_version(question_id):
+    """
+    Return the current results version of a question.
+
+    A missing version starts from the current time in milliseconds, so a
+    version key that was evicted can never come back to a number that an
+    old cached entry still uses.
+    """
+    cache = _cache()
+    key = VERSION_KEY.format(question_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_results_version(question_id):
+    """Invalidate the cached results of a question."""
+    cache = _cache()
+    key = VERSION_KEY.format(question_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+def get_results(question_id, version):
+    """Return the cached results of a question, or None on a miss."""
+    results = _cache().get(RESULTS_KEY.format(question_id), version=version)
+    _count("misses" if results is None else "hits")
+    return results
+
+
+def set_results(question_id, version, results, timeout=None):
+    """
+    Cache the results of a question under the given version.
+
+    The version must be read before loading the results, so a vote that
+    lands in between leaves them under the old version instead of the new.
+    The timeout defaults to RESULTS_CACHE_TIMEOUT.
+    """
+    _cache().set(RESULTS_KEY.format(question_id), results,
+                 timeout=timeout or settings.RESULTS_CACHE_TIMEOUT, version=version)
+
+
+async def aresults_version(question_id):
+    """Async version of results_version()."""
+    cache = _cache()
+    key = VERSION_KEY.format(question_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+async def aget_results(question_id, version):
+    """Async version of get_results()."""
+    results = await _cache().aget(RESULTS_KEY.format(question_id),
+                                  version=version)
+    _count("misses" if results is None else "hits")
+    return results
+
+
+async def aset_results(question_id, version, results, timeout=None):
+    """Async version of set_results()."""
+    await _cache().aset(RESULTS_KEY.format(question_id), results,
+                        timeout=timeout or settings.RESULTS_CACHE_TIMEOUT,
+                        version=version)
+
+
+def results_cache_stats():
+    """Return the hit and miss counters and the hit rate of this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def reset_results_cache_stats():
+    """Reset the hit and miss counters of this process."""
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
@@ -0,0 +1,48 @@
+"""
+Conditional GET for the index and results pages.
+
+A page's ETag covers the last modified times of the questions it shows,
+the user it is rendered for and the static files it links to, so a client
+holding the same page gets 304 Not Modified before the template renders.
+Pages carrying flash messages are always sent in full.
+"""
+import hashlib
+from django.contrib.messages import get_messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def page_etag(request, *parts):
+    """Return a strong ETag of the page made from parts, None to skip it."""
+    if len(get_messages(request)):
+        return None
+    user = request.user
+    viewer = user.get_username() if user.is_authenticated else ""
+    static = getattr(staticfiles_storage, "manifest_hash", "")
+    key = "\0".join(str(part) for part in (*parts, viewer, static))
+    return f'"{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def is_conditional(request):
+    """Return True if the client sent validators of a copy it holds."""
+    return "HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META
+
+
+def not_modified(request, etag, last_modified):
+    """Return a 304 response if the client's copy is current, else None."""
+    if etag is None:
+        return None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()))
+    return set_validators(request, response, etag, last_modified) \
+        if response is not None else None
+
+
+def set_validators(request, response, etag, last_modified):
+    """Add the ETag and Last-Modified headers, and ask to revalidate."""
+    if etag is not None:
+        response.headers.setdefault("ETag", etag)
+        response.headers.setdefault("Last-Modified", http_date(last_modified.timestamp()))
+    patch_cache_control(response, no_cache=True, private=request.user.is_authenticated)
+    return response
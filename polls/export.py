@@ -0,0 +1,130 @@
+"""
+Streaming export of poll results and raw votes.
+
+Rows are read with QuerySet.iterator(), a server-side cursor on PostgreSQL,
+and written to a StreamingHttpResponse as they arrive, so an export of
+millions of votes starts at once and runs in constant memory. Both exports
+are available as CSV and as JSON lines, optionally for one question.
+
+Under ASGI a StreamingHttpResponse reads a sync iterator to the end before
+it sends anything, so there the chunks are handed over by an async
+iterator that reads each one in a worker thread.
+"""
+import csv
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
+from mysite.routers import read_from_replica
+from .models import Vote
+from .views import choices_with_percentage
+
+
+RESULTS_FIELDS = ["question_id", "question", "choice_id", "choice", "votes", "percentage"]
+VOTES_FIELDS = ["vote_id", "question_id", "choice_id", "user_id", "username"]
+CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+class Echo:
+    """File-like object that returns what is written, for csv.writer."""
+
+    def write(self, value):
+        """Return value instead of storing it."""
+        return value
+
+
+def csv_lines(fields, rows):
+    """Yield the header and each row as a line of CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_lines(fields, rows):
+    """Yield each row as a JSON object on its own line."""
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row))) + "\n"
+
+
+def batched(lines, size):
+    """Join lines into strings of size lines, so each write is not tiny."""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+async def aiterate(chunks):
+    """Yield the chunks of a sync iterator, reading each in a worker thread."""
+    read = sync_to_async(next)
+    try:
+        while (chunk := await read(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def iterate(queryset):
+    """
+    Return an iterator over queryset in chunks of EXPORT_CHUNK_SIZE rows.
+
+    The database is chosen now, since the rows are only read once the view
+    has returned and its replica routing has ended.
+    """
+    return queryset.using(queryset.db).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def stream(request, name, fmt, fields, rows):
+    """Return a streaming download of rows in format fmt."""
+    lines = csv_lines(fields, rows) if fmt == "csv" else json_lines(fields, rows)
+    chunks = batched(lines, settings.EXPORT_CHUNK_SIZE)
+    if isinstance(request, ASGIRequest):
+        chunks = aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+def check_format(fmt):
+    """Raise Http404 for an unknown export format."""
+    if fmt not in CONTENT_TYPES:
+        raise Http404(f"Unknown export format {fmt!r}.")
+
+
+def question_filter(request, field):
+    """Return a filter on the question given in the query string, if any."""
+    question = request.GET.get("question")
+    if question is None:
+        return {}
+    if not question.isdigit():
+        raise Http404("Invalid question.")
+    return {field: int(question)}
+
+
+@staff_member_required
+@read_from_replica
+def results(request, fmt):
+    """Export the votes and percentage of every choice of every question."""
+    check_format(fmt)
+    rows = choices_with_percentage().filter(**question_filter(request, "question_id")).\
+        order_by("question_id", "pk").\
+        values_list("question_id", "question__question_text", "pk", "choice_text",
+                    "vote_count", "percentage")
+    return stream(request, "results", fmt, RESULTS_FIELDS, iterate(rows))
+
+
+@staff_member_required
+@read_from_replica
+def votes(request, fmt):
+    """Export every vote with its question, choice and user."""
+    check_format(fmt)
+    rows = Vote.objects.filter(**question_filter(request, "question_id")).order_by("pk").\
+        values_list("pk", "question_id", "choice_id", "user_id", "user__username")
+    return stream(request, "votes", fmt, VOTES_FIELDS, iterate(rows))
@@ -0,0 +1,221 @@
+"""
+Buffered, batched vote ingestion.
+
+When VOTE_BUFFER_ENABLED is set, accepted votes are put on a bounded
+in-process queue and a background writer records them in batches with
+record_votes(), every VOTE_BUFFER_FLUSH_MS milliseconds or every
+VOTE_BUFFER_BATCH_SIZE votes, whichever comes first. A full queue pushes
+back on the request for at most VOTE_BUFFER_PUT_TIMEOUT_MS and then falls
+back to a synchronous write. Votes still queued are flushed when the
+process exits. A batch that fails to write, for example while the
+database restarts, is tried again write_attempts times on a new
+connection with a growing delay, and then one vote at a time.
+
+A voter reads their own writes: the views call wait_for_pending() before
+reading a question, which waits until the voter's queued vote on it is
+written.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from .models import Vote
+from .voting import record_vote, record_votes
+
+
+logger = logging.getLogger("polls")
+
+
+class VoteBuffer:
+    """A bounded queue of votes drained by one background writer thread."""
+
+    def __init__(self, max_size, batch_size, flush_interval, put_timeout,
+                 write_attempts=3, retry_delay=0.1):
+        """Create the buffer, the writer thread starts on the first vote."""
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.write_attempts = write_attempts
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_size)
+        self._pending = {}
+        self._written = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def submit(self, vote):
+        """
+        Queue an unsaved vote to be written by the background writer.
+
+        Return False if the buffer is closed or stays full for longer than
+        put_timeout, the caller must then write the vote itself.
+        """
+        if self._closed.is_set():
+            return False
+        self._start()
+        key = (vote.user_id, vote.question_id)
+        with self._written:
+            self._pending[key] = vote
+        try:
+            self._queue.put(vote, timeout=self.put_timeout)
+        except queue.Full:
+            self._forget([vote])
+            return False
+        return True
+
+    def is_pending(self, user_id, question_id):
+        """Return True if the vote of a user on a question is not written."""
+        return (user_id, question_id) in self._pending
+
+    def wait_for(self, user_id, question_id, timeout=None):
+        """
+        Wait until the queued vote of a user on a question is written.
+
+        Return False if it is still pending after timeout seconds.
+        """
+        key = (user_id, question_id)
+        with self._written:
+            return self._written.wait_for(lambda: key not in self._pending,
+                                          timeout=timeout)
+
+    def close(self, timeout=None):
+        """Stop accepting votes and flush the ones already queued."""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _start(self):
+        """Start the writer thread unless it is already running."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="polls-vote-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        """Write batches until the buffer is closed and drained."""
+        try:
+            while not (self._closed.is_set() and self._queue.empty()):
+                batch = self._take_batch()
+                if batch:
+                    self._write(batch)
+        finally:
+            connection.close()
+
+    def _take_batch(self):
+        """Collect votes until the batch is full or the interval is over."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Record a batch, falling back to one vote at a time on failure."""
+        if not self._record(batch):
+            logger.error("Batched write of %d votes failed, retrying one by one", len(batch))
+            for vote in batch:
+                if not self._record([vote]):
+                    logger.error("Dropped vote of user %s on question %s",
+                                 vote.user_id, vote.question_id)
+        self._forget(batch)
+
+    def _record(self, votes):
+        """Record votes, trying write_attempts times, return True once written."""
+        for attempt in range(self.write_attempts):
+            try:
+                record_votes(votes)
+                return True
+            except Exception:
+                logger.exception("Write of %d votes failed, attempt %d of %d",
+                                 len(votes), attempt + 1, self.write_attempts)
+                # A broken connection is replaced on the next attempt
+                connection.close()
+                if attempt + 1 < self.write_attempts:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+        return False
+
+    def _forget(self, votes):
+        """Drop written votes from the pending map and wake their readers."""
+        with self._written:
+            for vote in votes:
+                key = (vote.user_id, vote.question_id)
+                if self._pending.get(key) is vote:
+                    del self._pending[key]
+            self._written.notify_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_vote_buffer():
+    """Return the vote buffer of this process, or None if it is disabled."""
+    global _buffer
+    if not settings.VOTE_BUFFER_ENABLED:
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = VoteBuffer(
+                    max_size=settings.VOTE_BUFFER_MAX_SIZE,
+                    batch_size=settings.VOTE_BUFFER_BATCH_SIZE,
+                    flush_interval=settings.VOTE_BUFFER_FLUSH_MS / 1000,
+                    put_timeout=settings.VOTE_BUFFER_PUT_TIMEOUT_MS / 1000,
+                    write_attempts=settings.VOTE_BUFFER_WRITE_ATTEMPTS,
+                    retry_delay=settings.VOTE_BUFFER_RETRY_MS / 1000,
+                )
+    return _buffer
+
+
+def accept_vote(user, choice):
+    """
+    Accept the vote of user for choice.
+
+    The vote goes through the buffer when it is enabled and has room, and
+    is written synchronously otherwise.
+    """
+    buffer = get_vote_buffer()
+    if buffer is not None:
+        vote = Vote(user=user, question_id=choice.question_id, choice=choice)
+        if buffer.submit(vote):
+            return
+        # Keep the order of this user's votes before writing around the queue.
+        buffer.wait_for(user.pk, choice.question_id,
+                        timeout=settings.VOTE_BUFFER_WAIT_TIMEOUT_MS / 1000)
+    record_vote(user, choice)
+
+
+def wait_for_pending(user, question_id):
+    """Wait until the queued vote of user on a question, if any, is written."""
+    buffer = get_vote_buffer()
+    if buffer is None or not user.is_authenticated:
+        return
+    if buffer.is_pending(user.pk, question_id):
+        buffer.wait_for(user.pk, question_id,
+                        timeout=settings.VOTE_BUFFER_WAIT_TIMEOUT_MS / 1000)
+
+
+async def await_pending(user, question_id):
+    """Async version of wait_for_pending(), only leaves the loop to wait."""
+    buffer = get_vote_buffer()
+    if buffer is None or not user.is_authenticated:
+        return
+    if buffer.is_pending(user.pk, question_id):
+        await sync_to_async(buffer.wait_for, thread_sensitive=False)(
+            user.pk, question_id,
+            timeout=settings.VOTE_BUFFER_WAIT_TIMEOUT_MS / 1000)
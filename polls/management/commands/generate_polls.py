@@ -0,0 +1,123 @@
+"""Create a synthetic data set of questions, choices, users and votes."""
+import datetime
+import random
+import time
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from polls.models import Choice, Question, Vote
+from polls.schedule import bump_schedule_version
+
+
+def skewed_weights(count, skew):
+    """Return Zipf-like weights, the first item is the most popular."""
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+def split_votes(total, weights, limit):
+    """Share total votes out by weights, giving no share more than limit."""
+    scale = total / sum(weights)
+    shares = [min(limit, int(weight * scale)) for weight in weights]
+    left = total - sum(shares)
+    for i in range(len(shares)):
+        if left <= 0:
+            break
+        extra = min(limit - shares[i], left)
+        shares[i] += extra
+        left -= extra
+    return shares
+
+
+class Command(BaseCommand):
+    """Create a synthetic data set for load tests and benchmarks."""
+
+    help = "Create N questions with M choices each, K users and V skewed votes."
+
+    def add_arguments(self, parser):
+        """Take the size and the shape of the data set."""
+        parser.add_argument("--questions", type=int, default=100)
+        parser.add_argument("--choices", type=int, default=5, help="choices per question")
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--votes", type=int, default=10000)
+        parser.add_argument("--skew", type=float, default=1.0,
+                            help="Zipf exponent of question and choice popularity, 0 is uniform")
+        parser.add_argument("--closed", type=float, default=0.2,
+                            help="fraction of questions whose voting has ended")
+        parser.add_argument("--password", default="synthetic",
+                            help="password of every synthetic user")
+        parser.add_argument("--prefix", default="synthetic")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        """Create the data set in one transaction."""
+        if options["votes"] > options["questions"] * options["users"]:
+            raise CommandError("There can be at most one vote per user per question.")
+        self.random = random.Random(options["seed"])
+        self.options = options
+        start = time.perf_counter()
+        with transaction.atomic():
+            questions = self.create_questions()
+            choices = self.create_choices(questions)
+            users = self.create_users()
+            votes = self.create_votes(questions, choices, users)
+        bump_schedule_version()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(questions)} questions, {len(choices)} choices, "
+            f"{len(users)} users and {votes} votes in {elapsed:.2f}s."))
+
+    def create_questions(self):
+        """Create questions, some of them already closed."""
+        now = timezone.now()
+        questions = []
+        for i in range(self.options["questions"]):
+            published = now - datetime.timedelta(days=self.random.uniform(1, 365))
+            closed = self.random.random() < self.options["closed"]
+            questions.append(Question(
+                question_text=f"{self.options['prefix'].capitalize()} question {i}",
+                published_date=published,
+                end_date=now - datetime.timedelta(hours=1) if closed else None))
+        return Question.objects.bulk_create(questions, batch_size=self.options["batch_size"])
+
+    def create_choices(self, questions):
+        """Create the same number of choices for every question."""
+        choices = [Choice(question=question, choice_text=f"Choice {i}")
+                   for question in questions for i in range(self.options["choices"])]
+        return Choice.objects.bulk_create(choices, batch_size=self.options["batch_size"])
+
+    def create_users(self):
+        """Create users that all share one password."""
+        password = make_password(self.options["password"])
+        prefix = self.options["prefix"]
+        users = [User(username=f"{prefix}{i}", password=password)
+                 for i in range(self.options["users"])]
+        User.objects.bulk_create(users, batch_size=self.options["batch_size"], ignore_conflicts=True)
+        return list(User.objects.filter(username__in=[user.username for user in users]))
+
+    def create_votes(self, questions, choices, users):
+        """Create skewed votes, at most one per user per question."""
+        skew = self.options["skew"]
+        per_question = self.options["choices"]
+        question_order = self.random.sample(range(len(questions)), len(questions))
+        shares = split_votes(self.options["votes"], skewed_weights(len(questions), skew), len(users))
+        choice_weights = skewed_weights(per_question, skew)
+        counts = [0] * len(choices)
+        batch, created = [], 0
+        for position, share in zip(question_order, shares):
+            question = questions[position]
+            for user in self.random.sample(users, share):
+                index = position * per_question + self.random.choices(
+                    range(per_question), choice_weights)[0]
+                counts[index] += 1
+                batch.append(Vote(user=user, question=question, choice=choices[index]))
+                if len(batch) >= self.options["batch_size"]:
+                    created += len(Vote.objects.bulk_create(batch))
+                    batch = []
+        created += len(Vote.objects.bulk_create(batch))
+        for choice, count in zip(choices, counts):
+            choice.vote_count = count
+        Choice.objects.bulk_update(choices, ["vote_count"], batch_size=self.options["batch_size"])
+        return created
@@ -0,0 +1,188 @@
+"""
+Load large JSON fixtures quickly.
+
+Unlike loaddata, the fixture files are read one record at a time and saved
+in batches, with PostgreSQL COPY when it is available and with bulk_create
+otherwise. Rows that already exist are skipped, so loading the same files
+again at every container start is cheap.
+"""
+import json
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import connection, transaction
+from polls.models import Choice, Question, Vote
+from polls.schedule import bump_schedule_version
+from polls.voting import recount_votes
+
+
+class FixtureReader:
+    """Read the records of a JSON fixture array one at a time."""
+
+    def __init__(self, stream, chunk_size=1 << 16):
+        """Read from stream chunk_size characters at a time."""
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+
+    def __iter__(self):
+        """Yield each record of the array."""
+        if self.next_char() != "[":
+            raise CommandError("Fixture is not a JSON array.")
+        self.pos += 1
+        if self.next_char() == "]":
+            return
+        while True:
+            yield self.decode()
+            separator = self.next_char()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise CommandError(f"Unexpected {separator!r} in fixture.")
+
+    def read_more(self, message):
+        """Append the next chunk to the unread part of the buffer."""
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            raise CommandError(message)
+        self.buffer, self.pos = self.buffer[self.pos:] + chunk, 0
+
+    def next_char(self):
+        """Return the next non-space character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.read_more("Unexpected end of fixture.")
+
+    def decode(self):
+        """Decode the record at the current position."""
+        self.next_char()
+        while True:
+            try:
+                record, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return record
+            except json.JSONDecodeError:
+                self.read_more("Invalid JSON in fixture.")
+
+
+def copy_insert(model, objects):
+    """Insert objects with COPY into a temporary table, skipping existing rows."""
+    quote = connection.ops.quote_name
+    fields = model._meta.concrete_fields
+    table = quote(model._meta.db_table)
+    staging = quote(f"load_{model._meta.db_table}")
+    columns = ", ".join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} "
+                       f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        with cursor.cursor.copy(f"COPY {staging} ({columns}) FROM STDIN") as copy:
+            for obj in objects:
+                copy.write_row([field.get_db_prep_save(field.pre_save(obj, add=True), connection)
+                                for field in fields])
+        cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} "
+                       f"FROM {staging} ON CONFLICT DO NOTHING")
+        cursor.execute(f"TRUNCATE {staging}")
+
+
+class Command(BaseCommand):
+    """Stream fixture files into the database in batches."""
+
+    help = "Load JSON fixtures in batches, skipping rows that already exist."
+
+    def add_arguments(self, parser):
+        """Take the fixture paths and the batch size."""
+        parser.add_argument("fixtures", nargs="+", help="Paths of JSON fixture files.")
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Number of rows saved per batch.")
+        parser.add_argument("--no-copy", action="store_true",
+                            help="Use bulk_create even on PostgreSQL.")
+
+    def handle(self, *args, **options):
+        """Load every fixture in one transaction and report the rates."""
+        self.batch_size = options["batch_size"]
+        self.use_copy = connection.vendor == "postgresql" and not options["no_copy"]
+        self.read = Counter()
+        self.existing = {}
+        self.choice_ids = set()
+        models = set()
+        start = time.perf_counter()
+        with transaction.atomic():
+            for path in options["fixtures"]:
+                with open(path, encoding="utf-8") as stream:
+                    models.update(self.load(FixtureReader(stream)))
+            self.reset_sequences(models)
+            if self.choice_ids:
+                recount_votes(Choice.objects.filter(pk__in=self.choice_ids))
+        if Question in models:
+            bump_schedule_version()
+        elapsed = time.perf_counter() - start
+        for model in models:
+            new = model.objects.count() - self.existing[model]
+            self.stdout.write(f"{model._meta.label}: {self.read[model]} rows read, "
+                              f"{new} new, {self.read[model] - new} skipped")
+        total = sum(self.read.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {total} rows in {elapsed:.2f}s "
+            f"({total / elapsed if elapsed else total:.0f} rows/s)."))
+
+    def load(self, records):
+        """Save the records in batches of one model and return the models."""
+        models = set()
+        batch, batch_model = [], None
+        for record in records:
+            obj = next(Deserializer([record], ignorenonexistent=True))
+            model = type(obj.object)
+            if batch and (model is not batch_model or len(batch) >= self.batch_size):
+                self.save(batch_model, batch)
+                batch = []
+            batch_model = model
+            batch.append(obj)
+            models.add(model)
+        if batch:
+            self.save(batch_model, batch)
+        return models
+
+    def save(self, model, batch):
+        """Insert one batch of deserialized objects of model."""
+        objects = [item.object for item in batch]
+        if model not in self.existing:
+            self.existing[model] = model.objects.count()
+        self.read[model] += len(objects)
+        if model is Vote:
+            self.prepare_votes(objects)
+        if model in (Vote, Choice):
+            self.choice_ids.update(obj.choice_id if model is Vote else obj.pk
+                                   for obj in objects)
+        if self.use_copy and all(obj.pk is not None for obj in objects):
+            copy_insert(model, objects)
+        else:
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+        for field in model._meta.many_to_many:
+            through = getattr(model, field.name).through
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            rows = [through(**{f"{source}_id": item.object.pk, f"{target}_id": pk})
+                    for item in batch for pk in item.m2m_data.get(field.name, [])]
+            through.objects.bulk_create(rows, ignore_conflicts=True)
+
+    def prepare_votes(self, votes):
+        """Fill the question of votes from fixtures made before it existed."""
+        missing = [vote for vote in votes if vote.question_id is None]
+        if missing:
+            questions = dict(Choice.objects.filter(
+                pk__in={vote.choice_id for vote in missing}).values_list("pk", "question_id"))
+            for vote in missing:
+                vote.question_id = questions.get(vote.choice_id)
+
+    def reset_sequences(self, models):
+        """Move primary key sequences past the loaded ids, as loaddata does."""
+        statements = connection.ops.sequence_reset_sql(no_style(), list(models))
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -0,0 +1,24 @@
+"""Repair the stored vote counter of each choice from the Vote table."""
+from django.core.management.base import BaseCommand
+from polls.models import Choice
+from polls.voting import recount_votes
+
+
+class Command(BaseCommand):
+    """Recount votes of every choice, or only of the given questions."""
+
+    help = "Recompute Choice.vote_count from the Vote table."
+
+    def add_arguments(self, parser):
+        """Allow limiting the recount to some questions."""
+        parser.add_argument("question_ids", nargs="*", type=int,
+                            help="Only recount choices of these questions.")
+
+    def handle(self, *args, **options):
+        """Recount and report how many counters were wrong."""
+        choices = Choice.objects.all()
+        if options["question_ids"]:
+            choices = choices.filter(question_id__in=options["question_ids"])
+        fixed = recount_votes(choices)
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted votes, {fixed} choice counter(s) repaired."))
@@ -0,0 +1,20 @@
+"""Add the votes cast or changed since the last run to the hourly rollup."""
+from django.core.management.base import BaseCommand
+from polls.rollup import rebuild_rollup, refresh_rollup, refreshed_until
+
+
+class Command(BaseCommand):
+    """Refresh VoteRollup incrementally, or rebuild it from every vote."""
+
+    help = "Add new and changed votes to the hourly vote rollup."
+
+    def add_arguments(self, parser):
+        """Allow rebuilding the rollup from scratch."""
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Empty the rollup and add up every vote again.")
+
+    def handle(self, *args, **options):
+        """Refresh the rollup and report how many votes were added."""
+        added = rebuild_rollup() if options["rebuild"] else refresh_rollup()
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {added} vote(s) to the rollup, up to {refreshed_until()}."))
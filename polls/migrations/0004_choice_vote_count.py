@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:24
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_votes(apps, schema_editor):
+    Choice = apps.get_model('polls', 'Choice')
+    counts = Choice.objects.annotate(total=Count('vote')).filter(total__gt=0)
+    for choice in counts.iterator():
+        Choice.objects.filter(pk=choice.pk).update(vote_count=choice.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0003_remove_choice_votes_vote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_votes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+
+
+def fill_question_and_dedupe(apps, schema_editor):
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    Vote.objects.update(question_id=Subquery(
+        Choice.objects.filter(pk=OuterRef('choice_id')).values('question_id')[:1]))
+    duplicates = Vote.objects.values('user_id', 'question_id').\
+        annotate(total=Count('pk'), latest=Max('pk')).filter(total__gt=1)
+    touched = set()
+    for row in duplicates.iterator():
+        stale = Vote.objects.filter(user_id=row['user_id'],
+                                    question_id=row['question_id']).\
+            exclude(pk=row['latest'])
+        touched.update(stale.values_list('choice_id', flat=True))
+        stale.delete()
+    for choice in Choice.objects.filter(pk__in=touched).\
+            annotate(total=Count('vote')):
+        Choice.objects.filter(pk=choice.pk).update(vote_count=choice.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0004_choice_vote_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.RunPython(fill_question_and_dedupe, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_vote_question'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='unique_vote_per_user_question'),
+        ),
+    ]
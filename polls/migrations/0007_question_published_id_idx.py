@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0006_vote_unique_vote_per_user_question'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['published_date', 'id'], name='question_published_id_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_question_published_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='last modified'),
+            preserve_default=False,
+        ),
+    ]
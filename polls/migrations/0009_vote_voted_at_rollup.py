@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_question_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='voted_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True, verbose_name='voted at'),
+        ),
+        migrations.CreateModel(
+            name='RollupMark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('high_water', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('votes', models.PositiveIntegerField(default=0)),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.choice')),
+                ('question', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                               to='polls.question')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('question', 'hour', 'choice'),
+                                                        name='unique_rollup_question_hour_choice')],
+            },
+        ),
+    ]
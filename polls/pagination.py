@@ -0,0 +1,43 @@
+"""Keyset (cursor) pagination over the published_date and id of questions."""
+import base64
+import binascii
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(question):
+    """Return an opaque cursor that points just after question."""
+    raw = f"{question.published_date.isoformat()}|{question.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return the (published_date, id) in cursor, or None if it is invalid."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        published, pk = raw.decode().split("|")
+        published_date = parse_datetime(published)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if published_date is None:
+        return None
+    return published_date, pk
+
+
+def paginate_after(queryset, cursor, page_size):
+    """
+    Return at most page_size + 1 questions after cursor.
+
+    The extra question is only used to tell whether a next page exists.
+    """
+    queryset = queryset.order_by("published_date", "id")
+    after = decode_cursor(cursor)
+    if after is not None:
+        published_date, pk = after
+        queryset = queryset.filter(
+            Q(published_date__gt=published_date)
+            | Q(published_date=published_date, id__gt=pk))
+    return queryset[:page_size + 1]
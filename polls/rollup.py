@@ -0,0 +1,89 @@
+"""
+Hourly rollup of votes for the vote history of each question.
+
+refresh_rollup adds the votes cast or changed since its high-water mark to
+VoteRollup, one row per question, hour and choice, so each refresh only
+reads the new votes through the index on Vote.voted_at. A vote that is
+changed is counted again for its new choice in the hour of the change, so
+the rollup counts votes cast and changed over time. Votes deleted after
+they were counted stay in the rollup.
+"""
+import datetime
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from .models import RollupMark, Vote, VoteRollup
+
+
+MARK_NAME = "votes"
+
+
+def refresh_rollup(until=None, batch_size=1000):
+    """
+    Add the votes cast or changed up to until to the rollup.
+
+    until defaults to ROLLUP_LAG seconds ago, so that votes whose
+    transactions are still open are counted by the next refresh rather than
+    skipped. Return the number of votes added.
+    """
+    if until is None:
+        until = timezone.now() - datetime.timedelta(seconds=settings.ROLLUP_LAG)
+    with transaction.atomic():
+        # Locking the mark lets one refresh run at a time
+        mark, _ = RollupMark.objects.select_for_update().get_or_create(name=MARK_NAME)
+        if mark.high_water is not None and mark.high_water >= until:
+            return 0
+        votes = Vote.objects.filter(voted_at__lte=until)
+        if mark.high_water is not None:
+            votes = votes.filter(voted_at__gt=mark.high_water)
+        counts = votes.annotate(hour=TruncHour("voted_at", tzinfo=datetime.timezone.utc)).\
+            order_by().values_list("question_id", "choice_id", "hour").annotate(votes=Count("pk"))
+        added = {(question_id, choice_id, hour): count
+                 for question_id, choice_id, hour, count in counts}
+        total = sum(added.values())
+        if added:
+            hours = [hour for _, _, hour in added]
+            existing = VoteRollup.objects.filter(
+                question_id__in={question_id for question_id, _, _ in added},
+                hour__gte=min(hours), hour__lte=max(hours)).\
+                values_list("question_id", "choice_id", "hour", "votes")
+            for question_id, choice_id, hour, count in existing:
+                if (question_id, choice_id, hour) in added:
+                    added[question_id, choice_id, hour] += count
+            VoteRollup.objects.bulk_create(
+                [VoteRollup(question_id=question_id, choice_id=choice_id, hour=hour, votes=count)
+                 for (question_id, choice_id, hour), count in added.items()],
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["question", "hour", "choice"],
+                update_fields=["votes"],
+            )
+        mark.high_water = until
+        mark.save(update_fields=["high_water"])
+    return total
+
+
+def rebuild_rollup():
+    """Empty the rollup and add up every vote again, return the votes added."""
+    with transaction.atomic():
+        VoteRollup.objects.all().delete()
+        RollupMark.objects.filter(name=MARK_NAME).delete()
+        return refresh_rollup()
+
+
+def refreshed_until():
+    """Return the time up to which votes are in the rollup, or None."""
+    return RollupMark.objects.filter(name=MARK_NAME).\
+        values_list("high_water", flat=True).first()
+
+
+def vote_history(question_id, since):
+    """Return the votes per hour since since of each choice of a question."""
+    history = {}
+    for choice_id, hour, votes in VoteRollup.objects.\
+            filter(question_id=question_id, hour__gte=since).\
+            order_by("hour", "choice_id").values_list("choice_id", "hour", "votes"):
+        history.setdefault(choice_id, []).append((hour, votes))
+    return history
@@ -0,0 +1,126 @@
+"""
+Precomputed schedule of which questions are published and open.
+
+Each process keeps one PollSchedule: the ids of the open questions, with
+their text for the open polls listing, the ids of the questions not yet
+published, and the next time any question opens or closes. Status lookups
+are set membership tests, and the schedule is only rebuilt from the
+database once that time has passed or when a question is saved or
+deleted, which bumps a version number in the default cache so every
+process sharing the cache rebuilds. The version only reaches the other
+processes when the default cache is shared, so a schedule is also
+rebuilt at least every SCHEDULE_MAX_AGE seconds, which bounds how long
+another process may keep a change made in the admin unseen.
+"""
+import datetime
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Question
+
+
+VERSION_KEY = "polls:schedule:version"
+
+_lock = threading.Lock()
+_schedule = None
+
+
+class PollSchedule:
+    """The status of every question until valid_until."""
+
+    def __init__(self, open_questions, upcoming_ids, valid_until, version):
+        """Hold the open questions as (id, text, end_date) rows."""
+        self.open_questions = open_questions
+        self.open_ids = frozenset(question_id for question_id, _, _ in open_questions)
+        self.upcoming_ids = upcoming_ids
+        self.valid_until = valid_until
+        self.version = version
+
+    def is_open(self, question_id):
+        """Return True if votes on the question are accepted."""
+        return question_id in self.open_ids
+
+    def is_published(self, question_id):
+        """Return True if the question's published date has passed."""
+        return question_id not in self.upcoming_ids
+
+    def is_current(self, now, version):
+        """Return True if the schedule still holds at now."""
+        return self.version == version and now < self.valid_until
+
+
+def schedule_version():
+    """Return the version of the schedule, see cache.results_version."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_schedule_version():
+    """Make every process rebuild its schedule on its next lookup."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def load_schedule(now, version):
+    """
+    Build the schedule at now from the primary database.
+
+    It holds until the next published date, or until just after the next
+    end date, since a question still accepts votes at its end date, and
+    for SCHEDULE_MAX_AGE seconds at most.
+    """
+    questions = Question.objects.using(DEFAULT_DB_ALIAS)
+    open_questions = list(questions.with_status(now).filter(is_open=True).
+                          order_by("-published_date", "-id").
+                          values_list("id", "question_text", "end_date"))
+    upcoming = questions.filter(published_date__gt=now)
+    next_open = upcoming.aggregate(next=Min("published_date"))["next"]
+    next_close = questions.filter(end_date__gte=now).aggregate(next=Min("end_date"))["next"]
+    if next_close is not None:
+        next_close += datetime.timedelta(microseconds=1)
+    max_age = now + datetime.timedelta(seconds=settings.SCHEDULE_MAX_AGE)
+    boundaries = [boundary for boundary in (next_open, next_close, max_age) if boundary is not None]
+    return PollSchedule(open_questions, frozenset(upcoming.values_list("id", flat=True)),
+                        min(boundaries), version)
+
+
+def current_schedule(now=None):
+    """Return the schedule at now, rebuilding it if it no longer holds."""
+    global _schedule
+    now = now or timezone.now()
+    version = schedule_version()
+    schedule = _schedule
+    if schedule is None or not schedule.is_current(now, version):
+        with _lock:
+            schedule = _schedule
+            if schedule is None or not schedule.is_current(now, version):
+                schedule = _schedule = load_schedule(now, version)
+    return schedule
+
+
+async def acurrent_schedule():
+    """Async version of current_schedule()."""
+    schedule, now = _schedule, timezone.now()
+    if schedule is not None and schedule.is_current(now, await cache.aget(VERSION_KEY)):
+        return schedule
+    return await sync_to_async(current_schedule)(now)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, **kwargs):
+    """Rebuild the schedules now and again once the change is committed."""
+    bump_schedule_version()
+    transaction.on_commit(bump_schedule_version)
@@ -0,0 +1,11 @@
+'use strict';
+{
+    // Reload the change list filtered on the object chosen in an autocomplete filter.
+    django.jQuery(document).on('change', 'select.admin-autocomplete-filter', function() {
+        const query = new URLSearchParams(this.parentElement.dataset.queryString);
+        if (this.value) {
+            query.set(this.name, this.value);
+        }
+        window.location.search = query.toString();
+    });
+}
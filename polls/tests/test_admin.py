@@ -0,0 +1,178 @@
+"""Test that the admin change lists scale with the number of rows."""
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from polls.admin import EstimatedCountPaginator
+from polls.models import Choice, Vote
+from polls.voting import record_vote
+from .test_voting import create_question
+
+
+class AdminChangeListTests(TestCase):
+    """Test the Vote and Choice change lists."""
+
+    def setUp(self):
+        """Create a question with two choices and log in a superuser."""
+        self.admin = User.objects.create_superuser(username="admin", password="admin")
+        self.question = create_question("Question", days=-1)
+        self.choices = [Choice.objects.create(question=self.question, choice_text=text)
+                        for text in ("Few", "Many")]
+        self.client.force_login(self.admin)
+
+    def vote(self, count, choice):
+        """Add count votes for choice by new users."""
+        for _ in range(count):
+            user = User.objects.create_user(username=f"voter{User.objects.count()}")
+            record_vote(user, choice)
+
+    def changelist_queries(self, name, **params):
+        """Return the number of queries run to show a change list."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f"admin:polls_{name}_changelist"), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_vote_list_queries_do_not_grow_with_rows(self):
+        """
+        The related objects of each vote are joined, not read row by row.
+        """
+        self.vote(2, self.choices[0])
+        self.changelist_queries("vote")
+        queries = self.changelist_queries("vote")
+        self.vote(10, self.choices[1])
+        self.assertEqual(self.changelist_queries("vote"), queries)
+
+    def test_user_filter_is_a_search_box(self):
+        """
+        The user filter lists no users, only the selected one.
+        """
+        self.vote(3, self.choices[0])
+        voter = User.objects.get(username="voter2")
+        response = self.client.get(reverse("admin:polls_vote_changelist"))
+        self.assertNotContains(response, "user__id__exact=")
+        self.assertContains(response, 'class="admin-autocomplete-filter admin-autocomplete"', count=2)
+        self.assertContains(response, "polls/autocomplete_filter.js")
+        response = self.client.get(reverse("admin:polls_vote_changelist"), {"user__id__exact": voter.id})
+        self.assertEqual(list(response.context["cl"].result_list), list(voter.vote_set.all()))
+        self.assertContains(response, f'<option value="{voter.id}" selected>voter2</option>', html=True)
+
+    def test_filter_search(self):
+        """
+        The filter searches users through the admin autocomplete view.
+        """
+        self.vote(1, self.choices[0])
+        response = self.client.get(reverse("admin:autocomplete"), {
+            "app_label": "polls", "model_name": "vote", "field_name": "user", "term": "voter"})
+        self.assertEqual([result["text"] for result in response.json()["results"]], ["voter1"])
+
+    def test_choices_sorted_by_votes(self):
+        """
+        The vote count column sorts on the stored count.
+        """
+        self.vote(1, self.choices[0])
+        self.vote(3, self.choices[1])
+        response = self.client.get(reverse("admin:polls_choice_changelist"), {"o": "-2"})
+        self.assertEqual(list(response.context["cl"].result_list), self.choices[::-1])
+        self.assertEqual(self.changelist_queries("choice", o="-2"), self.changelist_queries("choice"))
+
+
+class ChoiceAdminDeleteTests(TestCase):
+    """Test deleting choices in the admin."""
+
+    def test_bulk_delete_refreshes_results(self):
+        """
+        Deleting selected choices invalidates the cached results of their question.
+        """
+        question = create_question("Question", days=-1)
+        choices = [Choice.objects.create(question=question, choice_text=text) for text in ("Alpha", "Bravo", "Charlie")]
+        self.client.force_login(User.objects.create_superuser(username="admin", password="admin"))
+        url = reverse("polls:results", args=(question.id,))
+        self.assertContains(self.client.get(url), "Bravo")
+        response = self.client.post(reverse("admin:polls_choice_changelist"), {
+            "action": "delete_selected", "post": "yes",
+            "_selected_action": [choice.pk for choice in choices[1:]]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Choice.objects.count(), 1)
+        self.assertNotContains(self.client.get(url), "Bravo")
+
+
+class VoteAdminFormTests(TestCase):
+    """Test adding and changing votes in the admin."""
+
+    def setUp(self):
+        """Create two questions, a vote and log in a superuser."""
+        self.admin = User.objects.create_superuser(username="admin", password="admin")
+        self.voter = User.objects.create_user(username="voter")
+        self.choice1 = Choice.objects.create(question=create_question("Q1", days=-1), choice_text="C1")
+        self.choice2 = Choice.objects.create(question=self.choice1.question, choice_text="C2")
+        self.other = Choice.objects.create(question=create_question("Q2", days=-1), choice_text="C3")
+        record_vote(self.voter, self.choice1)
+        self.client.force_login(self.admin)
+
+    def test_second_vote_on_question_is_a_form_error(self):
+        """
+        Adding or moving a vote to a question the user voted on shows an error.
+        """
+        response = self.client.post(reverse("admin:polls_vote_add"),
+                                    {"user": self.voter.pk, "choice": self.choice2.pk})
+        self.assertContains(response, "voter already voted on this question.")
+        vote = Vote.objects.create(user=self.voter, choice=self.other)
+        response = self.client.post(reverse("admin:polls_vote_change", args=(vote.pk,)),
+                                    {"user": self.voter.pk, "choice": self.choice2.pk})
+        self.assertContains(response, "voter already voted on this question.")
+        self.assertEqual(Vote.objects.count(), 2)
+
+    def test_vote_moved_within_its_question(self):
+        """
+        A vote can be moved to another choice of the same question.
+        """
+        vote = Vote.objects.get()
+        response = self.client.post(reverse("admin:polls_vote_change", args=(vote.pk,)),
+                                    {"user": self.voter.pk, "choice": self.choice2.pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Choice.objects.order_by("pk").values_list("vote_count", flat=True)), [0, 1, 0])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """Test the paginator of the change lists."""
+
+    def setUp(self):
+        """Create a few votes."""
+        question = create_question("Question", days=-1)
+        choice = Choice.objects.create(question=question, choice_text="Choice")
+        for i in range(3):
+            record_vote(User.objects.create_user(username=f"voter{i}"), choice)
+
+    @mock.patch("polls.admin.estimated_count", return_value=5_000_000)
+    def test_large_table_is_estimated(self, estimated_count):
+        """
+        A whole large table is counted from its statistics.
+        """
+        self.assertEqual(EstimatedCountPaginator(Vote.objects.order_by("pk"), 100).count, 5_000_000)
+
+    @mock.patch("polls.admin.estimated_count", return_value=5_000_000)
+    def test_filtered_list_is_counted(self, estimated_count):
+        """
+        A filtered list is counted exactly.
+        """
+        paginator = EstimatedCountPaginator(Vote.objects.filter(user__username="voter1").order_by("pk"), 100)
+        self.assertEqual(paginator.count, 1)
+        estimated_count.assert_not_called()
+
+    @mock.patch("polls.admin.estimated_count", return_value=10)
+    def test_small_table_is_counted(self, estimated_count):
+        """
+        A table below the threshold is counted exactly.
+        """
+        self.assertEqual(EstimatedCountPaginator(Vote.objects.order_by("pk"), 100).count, 3)
+
+    def test_estimate_only_on_postgresql(self):
+        """
+        Without table statistics the count is exact.
+        """
+        if connection.vendor == "postgresql":
+            self.skipTest("PostgreSQL has table statistics")
+        self.assertEqual(EstimatedCountPaginator(Vote.objects.order_by("pk"), 100).count, 3)
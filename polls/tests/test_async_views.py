@@ -0,0 +1,186 @@
+"""Test async versions of the detail, results and vote views."""
+import asyncio
+import json
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+from mysite import ratelimit, urls as site_urls
+from mysite.routers import PIN_COOKIE
+from polls import urls as polls_urls
+from polls.broker import broker
+from polls.models import Choice, Vote
+from .test_voting import create_question
+
+
+class AsyncURLConf:
+    """The site URLconf with the async polls views."""
+
+    urlpatterns = [
+        path("polls/", include((polls_urls.async_urlpatterns, "polls"))),
+    ] + site_urls.urlpatterns
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf)
+class AsyncViewTests(TestCase):
+    """Test async versions of the detail, results and vote views."""
+
+    def setUp(self):
+        """Create a question with two choices and a user."""
+        cache.clear()
+        self.question = create_question("Q1", days=-1)
+        self.choice1 = Choice.objects.create(question=self.question, choice_text="C1")
+        self.choice2 = Choice.objects.create(question=self.question, choice_text="C2")
+        self.user = User.objects.create_user(username="test1", password="test1")
+
+    async def login(self):
+        """Log the test user in on the async client."""
+        await self.async_client.alogin(username="test1", password="test1")
+
+    async def test_vote_and_results(self):
+        """
+        An async vote is recorded and shows up on the async results page.
+        """
+        await self.login()
+        response = await self.async_client.post(
+            reverse("polls:vote", args=(self.question.id,)), {"choice": self.choice2.id})
+        self.assertEqual(response.status_code, 302)
+        vote = await Vote.objects.select_related("choice").aget(user=self.user)
+        self.assertEqual(vote.choice, self.choice2)
+        response = await self.async_client.get(reverse("polls:results", args=(self.question.id,)))
+        self.assertEqual(response.context["question"].total_votes, 1)
+
+    async def test_vote_requires_login(self):
+        """
+        Anonymous users are sent to the login page instead of voting.
+        """
+        response = await self.async_client.post(
+            reverse("polls:vote", args=(self.question.id,)), {"choice": self.choice1.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("login", response.url)
+        self.assertFalse(await Vote.objects.aexists())
+
+    @override_settings(RATE_LIMITS_ENABLED=True, RATE_LIMITS={"vote": {"user": "1/m"}})
+    async def test_vote_rate_limited(self):
+        """
+        The async vote view answers 429 to a user over the limit.
+        """
+        ratelimit.buckets.clear()
+        await self.login()
+        url = reverse("polls:vote", args=(self.question.id,))
+        codes = [(await self.async_client.post(url, {"choice": choice.id})).status_code
+                 for choice in (self.choice1, self.choice2)]
+        self.assertEqual(codes, [302, 429])
+
+    async def test_detail_checks_previous_vote(self):
+        """
+        The async detail page marks the choice the user voted for.
+        """
+        await sync_to_async(Vote.objects.create)(user=self.user, choice=self.choice1)
+        await self.login()
+        response = await self.async_client.get(reverse("polls:detail", args=(self.question.id,)))
+        self.assertEqual(response.context["user_vote"], self.choice1)
+        self.assertContains(response, self.question.question_text)
+
+    async def test_detail_of_missing_or_future_question(self):
+        """
+        Missing and not yet published questions redirect to the index page.
+        """
+        future = await sync_to_async(create_question)("Future", days=5)
+        for pk in (future.id, future.id + 100):
+            response = await self.async_client.get(reverse("polls:detail", args=(pk,)))
+            self.assertEqual(response.url, reverse("polls:index"))
+
+    async def test_results_not_modified(self):
+        """
+        Unchanged async results are answered with 304.
+        """
+        url = reverse("polls:results", args=(self.question.id,))
+        response = await self.async_client.get(url)
+        second = await self.async_client.get(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(second.status_code, 304)
+
+    async def test_pinned_client_skips_results_cache(self):
+        """
+        A client that has just voted reads its results past the results cache.
+        """
+        url = reverse("polls:results", args=(self.question.id,))
+        await self.async_client.get(url)
+        await Choice.objects.filter(pk=self.choice1.pk).aupdate(vote_count=1)
+        self.assertEqual((await self.async_client.get(url)).context["question"].total_votes, 0)
+        self.async_client.cookies[PIN_COOKIE] = "1"
+        self.assertEqual((await self.async_client.get(url)).context["question"].total_votes, 1)
+
+    async def test_results_of_missing_question(self):
+        """
+        The async results page of a missing question is a 404.
+        """
+        response = await self.async_client.get(reverse("polls:results", args=(self.question.id + 100,)))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf, RESULTS_STREAM_INTERVAL_MS=0)
+class ResultsStreamTests(TestCase):
+    """Test the live results stream and its broker."""
+
+    def setUp(self):
+        """Create a question with one choice."""
+        self.question = create_question("Q1", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="C1")
+
+    async def test_stream_sends_counts_and_updates(self):
+        """
+        The stream starts with the current counts and pushes them again on change.
+        """
+        response = await self.async_client.get(reverse("polls:results_stream", args=(self.question.id,)))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        first = await asyncio.wait_for(anext(events), 5)
+        self.assertTrue(first.startswith(b"event: results\n"))
+        self.assertEqual(json.loads(first.split(b"data: ")[1])["total_votes"], 0)
+        await Choice.objects.filter(pk=self.choice.pk).aupdate(vote_count=3)
+        broker.notify(self.question.id)
+        second = await asyncio.wait_for(anext(events), 5)
+        counts = json.loads(second.split(b"data: ")[1])
+        self.assertEqual(counts["choices"], [{"id": self.choice.id, "votes": 3, "percentage": 100.0}])
+        # The server cancels the read of a client that disconnects
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertNotIn(self.question.id, broker._channels)
+
+    async def test_subscribers_share_one_load(self):
+        """
+        One change loads the counts once for every subscriber of the question.
+        """
+        counts = {"total_votes": 1}
+        with mock.patch("polls.broker.load_counts", return_value=counts) as load_counts:
+            async with broker.subscribe(self.question.id) as first, \
+                    broker.subscribe(self.question.id) as second:
+                broker.notify(self.question.id)
+                received = await asyncio.wait_for(asyncio.gather(first.get(), second.get()), 5)
+        self.assertEqual(received, [counts, counts])
+        load_counts.assert_called_once_with(self.question.id)
+
+    async def test_failed_load_is_retried(self):
+        """
+        Counts that fail to load are logged and loaded again for the subscribers.
+        """
+        counts = {"total_votes": 1}
+        with mock.patch("polls.broker.load_counts", side_effect=[OSError("connection lost"), counts]), \
+                self.assertLogs("polls", "ERROR"):
+            async with broker.subscribe(self.question.id) as subscription:
+                broker.notify(self.question.id)
+                received = await asyncio.wait_for(subscription.get(), 5)
+        self.assertEqual(received, counts)
+
+    async def test_stream_of_missing_question(self):
+        """
+        There is no stream for a question that does not exist.
+        """
+        response = await self.async_client.get(reverse("polls:results_stream", args=(self.question.id + 100,)))
+        self.assertEqual(response.status_code, 404)
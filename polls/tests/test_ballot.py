@@ -0,0 +1,107 @@
+"""Test the batch ballot endpoint."""
+import json
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from polls.models import Choice, Vote
+from polls.schedule import current_schedule
+from .test_voting import create_question
+
+
+class BallotTests(TestCase):
+    """Test voting on many questions in one request."""
+
+    def setUp(self):
+        """Create open questions with two choices each and log in a user."""
+        self.questions = [create_question(f"Q{i}", days=-1) for i in range(20)]
+        self.choices = [[Choice.objects.create(question=question, choice_text=text) for text in ("A", "B")]
+                        for question in self.questions]
+        self.user = User.objects.create_user(username="voter", password="secret")
+        self.client.force_login(self.user)
+
+    def post(self, votes):
+        """Post a ballot and return the response."""
+        return self.client.post(reverse("polls:ballot"), json.dumps({"votes": votes}),
+                                content_type="application/json")
+
+    def test_whole_ballot_in_a_few_queries(self):
+        """
+        A 20 question ballot costs the session and user, one query to check
+        the choices and five to lock the voter and write the votes, counts
+        and questions.
+        """
+        current_schedule()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post([{"question": question.id, "choice": choices[1].id}
+                                  for question, choices in zip(self.questions, self.choices)])
+        self.assertEqual(len([query for query in queries if "SAVEPOINT" not in query["sql"]]), 8)
+        self.assertEqual(response.json()["recorded"], 20)
+        self.assertEqual(Vote.objects.filter(user=self.user, choice__choice_text="B").count(), 20)
+        self.assertEqual(set(Choice.objects.filter(choice_text="B").values_list("vote_count", flat=True)), {1})
+
+    def test_per_item_results(self):
+        """
+        Invalid votes are rejected with a reason and the others recorded.
+        """
+        closed = create_question("Future", days=1)
+        closed_choice = Choice.objects.create(question=closed, choice_text="C")
+        q0, q1 = self.questions[:2]
+        response = self.post([
+            {"question": q0.id, "choice": self.choices[0][0].id},
+            {"question": q1.id, "choice": self.choices[0][1].id},
+            {"question": closed.id, "choice": closed_choice.id},
+            {"question": q0.id, "choice": self.choices[0][1].id},
+            {"question": "x"},
+        ])
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results],
+                         ["recorded", "rejected", "rejected", "rejected", "rejected"])
+        self.assertIn("not one of the question's choices", results[1]["error"])
+        self.assertIn("not allowed", results[2]["error"])
+        self.assertIn("more than once", results[3]["error"])
+        self.assertEqual(results[4]["question"], None)
+        self.assertEqual(list(Vote.objects.filter(user=self.user).values_list("choice_id", flat=True)),
+                         [self.choices[0][0].id])
+
+    def test_only_integer_ids_are_accepted(self):
+        """
+        Ids that are not JSON integers within the bigint range are rejected.
+        """
+        question, choice = self.questions[0].id, self.choices[0][0].id
+        items = ['{"question": %d, "choice": 1e400}' % question,
+                 '{"question": %d, "choice": %d.0}' % (question, choice),
+                 '{"question": %d, "choice": "%d"}' % (question, choice),
+                 '{"question": true, "choice": %d}' % choice,
+                 '{"question": %d, "choice": %d}' % (question, 2 ** 63),
+                 '{"question": %d, "choice": 0}' % question]
+        response = self.client.post(reverse("polls:ballot"), '{"votes": [%s]}' % ", ".join(items),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({result["status"] for result in response.json()["results"]}, {"rejected"})
+        self.assertFalse(Vote.objects.exists())
+
+    def test_changes_previous_votes(self):
+        """
+        A ballot changes the user's earlier votes and moves the counts.
+        """
+        question, (a, b) = self.questions[0], self.choices[0]
+        self.post([{"question": question.id, "choice": a.id}])
+        self.post([{"question": question.id, "choice": b.id}])
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.vote_count, b.vote_count), (0, 1))
+
+    @override_settings(BALLOT_MAX_VOTES=2)
+    def test_bad_requests(self):
+        """
+        Malformed or oversized ballots, anonymous users and GET are refused.
+        """
+        url = reverse("polls:ballot")
+        self.assertEqual(self.client.post(url, "{", content_type="application/json").status_code, 400)
+        self.assertEqual(self.client.post(url, "[]", content_type="application/json").status_code, 400)
+        self.assertEqual(self.post([{}] * 3).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.post([]).status_code, 401)
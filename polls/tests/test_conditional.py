@@ -0,0 +1,101 @@
+"""Test conditional GET of the index and results pages."""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from polls.models import Choice, Question
+from polls.voting import record_vote, recount_votes
+from .test_voting import create_question
+
+
+class ConditionalGetTests(TestCase):
+    """Test conditional GET of the index and results pages."""
+
+    def setUp(self):
+        """Create a question with a choice and a user."""
+        cache.clear()
+        self.question = create_question("Q1", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="C1")
+        self.user = User.objects.create_user(username="test1", password="test1")
+        self.results_url = reverse("polls:results", args=(self.question.id,))
+
+    def revalidate(self, url, response):
+        """Request url again with the validators of response."""
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"],
+                               HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+
+    def test_unchanged_results_not_modified(self):
+        """
+        Unchanged results are answered with 304, without loading them again.
+        """
+        response = self.client.get(self.results_url)
+        self.assertIn("no-cache", response["Cache-Control"])
+        with self.assertNumQueries(0):
+            second = self.revalidate(self.results_url, response)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], response["ETag"])
+        self.assertEqual(second.content, b"")
+
+    def test_not_modified_without_loading_results(self):
+        """
+        On a results cache miss a 304 only reads the last modified time.
+        """
+        response = self.client.get(self.results_url)
+        cache.clear()
+        with self.assertNumQueries(1):
+            second = self.revalidate(self.results_url, response)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], response["ETag"])
+
+    def test_vote_changes_results(self):
+        """
+        A vote moves the last modified time and the results are sent again.
+        """
+        response = self.client.get(self.results_url)
+        before = Question.objects.get(pk=self.question.pk).last_modified
+        record_vote(self.user, self.choice)
+        cache.clear()
+        self.assertGreater(Question.objects.get(pk=self.question.pk).last_modified, before)
+        second = self.revalidate(self.results_url, response)
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], response["ETag"])
+
+    def test_recount_changes_results(self):
+        """
+        A repaired vote counter moves the last modified time.
+        """
+        before = Question.objects.get(pk=self.question.pk).last_modified
+        Choice.objects.filter(pk=self.choice.pk).update(vote_count=5)
+        recount_votes()
+        self.assertGreater(Question.objects.get(pk=self.question.pk).last_modified, before)
+
+    def test_etag_depends_on_user(self):
+        """
+        Logging in changes the ETag, as the page shows who is logged in.
+        """
+        response = self.client.get(reverse("polls:index"))
+        self.client.force_login(self.user)
+        second = self.revalidate(reverse("polls:index"), response)
+        self.assertEqual(second.status_code, 200)
+        self.assertIn("private", second["Cache-Control"])
+
+    def test_unchanged_index_not_modified(self):
+        """
+        An unchanged index page is answered with 304 until a question changes.
+        """
+        url = reverse("polls:index")
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.question.question_text = "Edited"
+        self.question.save()
+        self.assertContains(self.revalidate(url, response), "Edited")
+
+    def test_page_with_message_is_sent(self):
+        """
+        The results page shown after a vote, with its message, is sent in full.
+        """
+        response = self.client.get(self.results_url)
+        self.client.force_login(self.user)
+        self.client.post(reverse("polls:vote", args=(self.question.id,)), {"choice": self.choice.id})
+        second = self.revalidate(self.results_url, response)
+        self.assertContains(second, "has been recorded")
@@ -2,6 +2,8 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth.models import User
+from polls.models import Choice, Vote
+from polls.schedule import current_schedule
 from .test_voting import create_question
 
 
@@ -31,3 +33,41 @@ class QuestionDetailViewTests(TestCase):
         url = reverse("polls:detail", args=(past_question.id,))
         response = self.client.get(url)
         self.assertContains(response, past_question.question_text)
+
+    def test_queries_with_vote(self):
+        """
+        The question, its choices and the user's vote load in two queries,
+        after the two queries that load the session and the user.
+        """
+        user = User.objects.create_user(username="test1", password="test1")
+        question = create_question(question_text="Past Question.", days=-5)
+        choices = [Choice.objects.create(question=question, choice_text=f"C{i}") for i in range(5)]
+        Vote.objects.create(user=user, choice=choices[3])
+        self.client.force_login(user)
+        current_schedule()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("polls:detail", args=(question.id,)))
+        self.assertEqual(response.context["user_vote"], choices[3])
+        self.assertContains(response, "checked", count=1)
+
+    def test_queries_anonymous(self):
+        """
+        An anonymous visitor needs two queries and has no vote.
+        """
+        question = create_question(question_text="Past Question.", days=-5)
+        Choice.objects.create(question=question, choice_text="C1")
+        current_schedule()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("polls:detail", args=(question.id,)))
+        self.assertIsNone(response.context["user_vote"])
+
+    def test_closed_question_queries(self):
+        """
+        A question closed for voting is rejected after one query, without
+        loading its choices.
+        """
+        question = create_question(question_text="Future question.", days=5)
+        current_schedule()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("polls:detail", args=(question.id,)))
+        self.assertEqual(response.url, reverse("polls:index"))
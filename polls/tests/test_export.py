@@ -0,0 +1,91 @@
+"""Test the streaming exports of results and votes."""
+import csv
+import io
+import json
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from polls.models import Choice
+from polls.voting import record_vote
+from .test_voting import create_question
+
+
+class ExportTests(TestCase):
+    """Test the streaming exports of results and votes."""
+
+    def setUp(self):
+        """Create two questions with votes and log in a staff user."""
+        self.staff = User.objects.create_user(username="staff", password="staff", is_staff=True)
+        self.q1 = create_question("Q1", days=-1)
+        self.q2 = create_question("Q2", days=-1)
+        self.c1 = Choice.objects.create(question=self.q1, choice_text="C1")
+        self.c2 = Choice.objects.create(question=self.q1, choice_text="C2")
+        self.c3 = Choice.objects.create(question=self.q2, choice_text="C3")
+        for i, choice in enumerate([self.c1, self.c1, self.c1, self.c2, self.c3]):
+            user = User.objects.create_user(username=f"user{i}")
+            record_vote(user, choice)
+        self.client.force_login(self.staff)
+
+    def download(self, name, fmt, **params):
+        """Return the body of a streamed export."""
+        response = self.client.get(reverse(f"polls:export_{name}", args=(fmt,)), params)
+        self.assertTrue(response.streaming)
+        self.assertIn(f'filename="{name}.{fmt}"', response["Content-Disposition"])
+        return b"".join(response.streaming_content).decode()
+
+    def test_results_csv(self):
+        """
+        The results export has one CSV row per choice with its vote share.
+        """
+        rows = list(csv.DictReader(io.StringIO(self.download("results", "csv"))))
+        self.assertEqual([(row["choice"], row["votes"], float(row["percentage"])) for row in rows],
+                         [("C1", "3", 75.0), ("C2", "1", 25.0), ("C3", "1", 100.0)])
+        self.assertEqual(rows[0]["question"], "Q1")
+
+    def test_votes_jsonl_of_one_question(self):
+        """
+        The votes export can be limited to one question.
+        """
+        lines = self.download("votes", "jsonl", question=self.q2.id).splitlines()
+        user = User.objects.get(username="user4")
+        self.assertEqual([json.loads(line) for line in lines], [{
+            "vote_id": user.vote_set.get().pk, "question_id": self.q2.id, "choice_id": self.c3.id,
+            "user_id": user.id, "username": "user4"}])
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_streamed_in_chunks(self):
+        """
+        Rows are sent in chunks of EXPORT_CHUNK_SIZE lines.
+        """
+        response = self.client.get(reverse("polls:export_votes", args=("csv",)))
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sum(chunk.count(b"\n") for chunk in chunks), 6)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_streamed_asynchronously_under_asgi(self):
+        """
+        Under ASGI the chunks are streamed by an async iterator as they are read.
+        """
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse("polls:export_votes", args=("csv",)))
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0].splitlines()[0], b"vote_id,question_id,choice_id,user_id,username")
+
+    def test_staff_only(self):
+        """
+        Users who are not staff cannot export.
+        """
+        self.client.force_login(User.objects.get(username="user0"))
+        response = self.client.get(reverse("polls:export_votes", args=("csv",)))
+        self.assertEqual(response.status_code, 302)
+
+    def test_unknown_format(self):
+        """
+        An unknown format or question is a 404.
+        """
+        self.assertEqual(self.client.get(reverse("polls:export_votes", args=("xml",))).status_code, 404)
+        response = self.client.get(reverse("polls:export_votes", args=("csv",)), {"question": "x"})
+        self.assertEqual(response.status_code, 404)
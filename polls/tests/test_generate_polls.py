@@ -0,0 +1,31 @@
+"""Test the generate_polls management command."""
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from polls.models import Choice, Question, Vote
+from polls.voting import recount_votes
+
+
+class GeneratePollsTests(TestCase):
+    """Test the generate_polls management command."""
+
+    def test_data_set_size_and_counters(self):
+        """
+        The requested numbers of rows are created with correct vote counters.
+        """
+        call_command("generate_polls", questions=10, choices=3, users=20, votes=150,
+                     seed=1, stdout=StringIO())
+        self.assertEqual(Question.objects.count(), 10)
+        self.assertEqual(Choice.objects.count(), 30)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Vote.objects.count(), 150)
+        self.assertEqual(recount_votes(), 0)
+
+    def test_too_many_votes(self):
+        """
+        More votes than users times questions cannot be created.
+        """
+        with self.assertRaises(CommandError):
+            call_command("generate_polls", questions=2, users=2, votes=5, stdout=StringIO())
@@ -1,6 +1,12 @@
 """Test index view of polls app."""
+import datetime
+from django.contrib.auth.models import User
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
+from polls.models import Question
+from polls.schedule import current_schedule
+from polls.views import IndexView
 from .test_voting import create_question
 
 
@@ -63,3 +69,85 @@ class QuestionIndexViewTests(TestCase):
             [question2, question1],
             ordered=False
         )
+
+
+class QuestionIndexPaginationTests(TestCase):
+    """Test keyset pagination and open status of the index page."""
+
+    def test_pages_follow_cursor(self):
+        """
+        Following next_cursor walks every published question exactly once.
+        """
+        published = timezone.now() - datetime.timedelta(days=1)
+        questions = [Question.objects.create(question_text=f"Q{i}", published_date=published)
+                     for i in range(IndexView.page_size + 5)]
+        response = self.client.get(reverse("polls:index"))
+        first_page = list(response.context["latest_question_list"])
+        self.assertEqual(len(first_page), IndexView.page_size)
+        cursor = response.context["next_cursor"]
+        response = self.client.get(reverse("polls:index"), {"after": cursor})
+        second_page = list(response.context["latest_question_list"])
+        self.assertEqual(first_page + second_page, questions)
+        self.assertIsNone(response.context["next_cursor"])
+
+    def test_invalid_cursor_shows_first_page(self):
+        """
+        A cursor that cannot be decoded falls back to the first page.
+        """
+        question = create_question(question_text="Past question.", days=-1)
+        response = self.client.get(reverse("polls:index"), {"after": "not-a-cursor"})
+        self.assertQuerySetEqual(response.context["latest_question_list"], [question])
+
+    def test_open_status_is_annotated(self):
+        """
+        The open status comes from the poll schedule instead of can_vote().
+        """
+        now = timezone.now()
+        Question.objects.create(question_text="Open", published_date=now - datetime.timedelta(days=2))
+        Question.objects.create(question_text="Closed", published_date=now - datetime.timedelta(days=2),
+                                end_date=now - datetime.timedelta(days=1))
+        response = self.client.get(reverse("polls:index"))
+        status = {q.question_text: q.is_open for q in response.context["latest_question_list"]}
+        self.assertEqual(status, {"Open": True, "Closed": False})
+        self.assertContains(response, "Status: Closed")
+
+    def test_question_missing_from_stale_schedule(self):
+        """
+        A question another process added since the schedule was built is shown
+        without an error.
+        """
+        create_question(question_text="Known.", days=-1)
+        schedule = current_schedule()
+        Question.objects.bulk_create([Question(question_text="Added elsewhere.",
+                                               published_date=timezone.now() - datetime.timedelta(days=1))])
+        self.assertFalse(schedule.is_open(Question.objects.get(question_text="Added elsewhere.").pk))
+        response = self.client.get(reverse("polls:index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Added elsewhere.")
+
+    def test_one_query_per_page(self):
+        """
+        Rendering a page of questions costs a single query.
+        """
+        for i in range(30):
+            create_question(question_text=f"Q{i}", days=-1)
+        current_schedule()
+        with self.assertNumQueries(1):
+            self.client.get(reverse("polls:index"))
+
+    def test_cached_fragments_follow_changes(self):
+        """
+        The cached question cards and header follow edits, closing and login.
+        """
+        question = create_question(question_text="Before edit.", days=-1)
+        self.assertContains(self.client.get(reverse("polls:index")), "Login")
+        question.question_text = "After edit."
+        question.end_date = timezone.now() - datetime.timedelta(minutes=1)
+        question.save()
+        User.objects.create_user(username="test1", password="test1")
+        self.client.login(username="test1", password="test1")
+        response = self.client.get(reverse("polls:index"))
+        self.assertContains(response, "After edit.")
+        self.assertContains(response, "Status: Closed")
+        self.assertNotContains(response, "Before edit.")
+        self.assertContains(response, "Log Out")
@@ -0,0 +1,113 @@
+"""Test buffered, batched vote ingestion."""
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from polls import ingest
+from polls.ingest import VoteBuffer
+from polls.models import Choice, Vote
+from polls.voting import record_votes
+from .test_voting import create_question
+
+
+def make_vote(user, choice):
+    """Return an unsaved vote of user for choice."""
+    return Vote(user=user, question_id=choice.question_id, choice=choice)
+
+
+class VoteBufferTests(TransactionTestCase):
+    """Test the vote buffer and its background writer."""
+
+    def setUp(self):
+        """Create a question with two choices and a voter."""
+        self.question = create_question("Q1", days=-1)
+        self.choice1 = Choice.objects.create(question=self.question, choice_text="C1")
+        self.choice2 = Choice.objects.create(question=self.question, choice_text="C2")
+        self.user = User.objects.create_user(username="test1", password="test1")
+
+    def test_repeat_votes_are_coalesced(self):
+        """
+        Queued votes of one user on one question are written once, last one wins.
+        """
+        buffer = VoteBuffer(max_size=10, batch_size=10, flush_interval=0.05, put_timeout=0)
+        for choice in [self.choice1, self.choice2, self.choice1, self.choice2]:
+            self.assertTrue(buffer.submit(make_vote(self.user, choice)))
+        buffer.close()
+        self.assertEqual(Vote.objects.get().choice, self.choice2)
+        self.choice1.refresh_from_db()
+        self.choice2.refresh_from_db()
+        self.assertEqual((self.choice1.votes, self.choice2.votes), (0, 1))
+        self.assertFalse(buffer.is_pending(self.user.pk, self.question.pk))
+
+    def test_full_buffer_refuses_vote(self):
+        """
+        When the queue stays full, submit() refuses the vote for a synchronous write.
+        """
+        buffer = VoteBuffer(max_size=1, batch_size=10, flush_interval=0.05, put_timeout=0)
+        other = User.objects.create_user(username="test2", password="test2")
+        with mock.patch.object(buffer, "_start"):
+            self.assertTrue(buffer.submit(make_vote(self.user, self.choice1)))
+            self.assertFalse(buffer.submit(make_vote(other, self.choice1)))
+        self.assertFalse(buffer.is_pending(other.pk, self.question.pk))
+
+    def test_failed_write_is_retried(self):
+        """
+        A batch whose write fails is written again instead of dropped.
+        """
+        buffer = VoteBuffer(max_size=10, batch_size=10, flush_interval=0.05, put_timeout=0, retry_delay=0)
+        failures = [OperationalError("server closed the connection")] * 2
+
+        def flaky_record_votes(votes):
+            if failures:
+                raise failures.pop()
+            return record_votes(votes)
+
+        with mock.patch("polls.ingest.record_votes", side_effect=flaky_record_votes), \
+                self.assertLogs("polls", "ERROR"):
+            self.assertTrue(buffer.submit(make_vote(self.user, self.choice1)))
+            buffer.close()
+        self.assertEqual(Vote.objects.get().choice, self.choice1)
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 1)
+
+    def test_closed_buffer_refuses_vote(self):
+        """
+        A closed buffer does not accept votes anymore.
+        """
+        buffer = VoteBuffer(max_size=10, batch_size=10, flush_interval=0.05, put_timeout=0)
+        buffer.close()
+        self.assertFalse(buffer.submit(make_vote(self.user, self.choice1)))
+
+
+@override_settings(VOTE_BUFFER_ENABLED=True, VOTE_BUFFER_FLUSH_MS=500)
+class BufferedVoteViewTests(TransactionTestCase):
+    """Test the vote view with buffered ingestion enabled."""
+
+    def setUp(self):
+        """Create a question, log a user in and start from a fresh buffer."""
+        cache.clear()
+        ingest._buffer = None
+        self.question = create_question("Q1", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="C1")
+        User.objects.create_user(username="test1", password="test1")
+        self.client.login(username="test1", password="test1")
+
+    def tearDown(self):
+        """Flush and drop the buffer used by the test."""
+        ingest.get_vote_buffer().close()
+        ingest._buffer = None
+
+    def test_voter_reads_own_vote(self):
+        """
+        Results and detail pages show the voter's vote even before the flush.
+        """
+        self.client.post(reverse("polls:vote", args=(self.question.id,)),
+                         {"choice": self.choice.id})
+        user = User.objects.get(username="test1")
+        self.assertTrue(ingest.get_vote_buffer().is_pending(user.pk, self.question.pk))
+        response = self.client.get(reverse("polls:results", args=(self.question.id,)))
+        self.assertEqual(response.context["question"].total_votes, 1)
+        response = self.client.get(reverse("polls:detail", args=(self.question.id,)))
+        self.assertEqual(response.context["user_vote"], self.choice)
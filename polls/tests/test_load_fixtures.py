@@ -0,0 +1,80 @@
+"""Test the load_fixtures management command."""
+import io
+import json
+import tempfile
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from polls.management.commands.load_fixtures import FixtureReader
+from polls.models import Choice, Question, Vote
+
+
+FIXTURES = [str(settings.BASE_DIR / "data" / name)
+            for name in ("polls-v4.json", "users.json", "votes-v4.json")]
+
+
+class LoadFixturesTests(TestCase):
+    """Test the load_fixtures management command."""
+
+    def load(self, *fixtures):
+        """Run load_fixtures with bulk_create and return its output."""
+        out = io.StringIO()
+        call_command("load_fixtures", *fixtures, "--no-copy", "--batch-size", "5", stdout=out)
+        return out.getvalue()
+
+    def test_stream_matches_json_load(self):
+        """
+        Reading a fixture in small chunks yields the same records as json.load.
+        """
+        for path in FIXTURES:
+            with open(path, encoding="utf-8") as stream:
+                records = list(FixtureReader(stream, chunk_size=7))
+            with open(path, encoding="utf-8") as stream:
+                self.assertEqual(records, json.load(stream))
+
+    def test_load_data_set(self):
+        """
+        The bundled data set is loaded and the vote counters are set.
+        """
+        output = self.load(*FIXTURES)
+        self.assertEqual(Question.objects.count(), 2)
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Vote.objects.count(), 2)
+        self.assertEqual(sorted(Choice.objects.filter(vote_count__gt=0).values_list("pk", flat=True)), [10, 19])
+        self.assertIn("rows/s", output)
+
+    def test_rows_counted_once_per_model(self):
+        """
+        Each table is counted once before its first batch and once for the
+        report, however many batches it takes.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.load(*FIXTURES)
+        counts = Counter(query["sql"].split(" FROM ")[1] for query in queries if "COUNT(*)" in query["sql"])
+        self.assertEqual(set(counts.values()), {2})
+
+    def test_existing_rows_are_skipped(self):
+        """
+        Loading the same files again inserts nothing.
+        """
+        self.load(*FIXTURES)
+        output = self.load(*FIXTURES)
+        self.assertIn("polls.Vote: 2 rows read, 0 new, 2 skipped", output)
+        self.assertEqual(Vote.objects.count(), 2)
+
+    def test_vote_without_question(self):
+        """
+        Votes dumped before Vote.question existed get it from their choice.
+        """
+        self.load(*FIXTURES[:2])
+        votes = [{"model": "polls.vote", "pk": 1, "fields": {"choice": 14, "user": 6}}]
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as fixture:
+            json.dump(votes, fixture)
+            fixture.flush()
+            self.load(fixture.name)
+        self.assertEqual(Vote.objects.get(pk=1).question_id, 3)
+        self.assertEqual(Choice.objects.get(pk=14).votes, 1)
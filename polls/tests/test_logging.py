@@ -0,0 +1,90 @@
+"""Test the JSON lines queue handler of the polls logger."""
+import json
+import logging
+import os
+import tempfile
+from django.test import SimpleTestCase
+from mysite.log import JsonFormatter, QueueFileHandler
+
+
+class QueueFileHandlerTests(SimpleTestCase):
+    """Test the JSON lines queue handler of the polls logger."""
+
+    def setUp(self):
+        """Log to a handler writing in a temporary directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "polls.log")
+        self.handler = QueueFileHandler(self.path, max_bytes=2000, backup_count=2)
+        self.handler.setFormatter(JsonFormatter())
+        self.addCleanup(self.handler.stop)
+        self.logger = logging.Logger("polls.test")
+        self.logger.addHandler(self.handler)
+
+    def read(self, path=None):
+        """Stop the handler and return the records written to path."""
+        self.handler.stop()
+        with open(path or self.path, encoding="utf-8") as stream:
+            return [json.loads(line) for line in stream]
+
+    def test_json_lines_with_extra_fields(self):
+        """
+        Each record is a JSON object with its message and extra fields.
+        """
+        self.logger.info("%s vote for %s", "user1", "C1", extra={"event": "vote", "question": 3})
+        record, = self.read()
+        self.assertEqual(record["message"], "user1 vote for C1")
+        self.assertEqual(record["level"], "INFO")
+        self.assertEqual((record["event"], record["question"]), ("vote", 3))
+
+    def test_exception(self):
+        """
+        The traceback of an exception is written with the record.
+        """
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            self.logger.exception("failed")
+        record, = self.read()
+        self.assertIn("ValueError: bad", record["exception"])
+
+    def test_rotation(self):
+        """
+        The file is rotated by size, keeping backup_count old files.
+        """
+        for i in range(100):
+            self.logger.info("message %d", i)
+        records = self.read()
+        self.assertEqual(records[-1]["message"], "message 99")
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        self.assertTrue(os.path.exists(self.path + ".2"))
+        self.assertFalse(os.path.exists(self.path + ".3"))
+
+    def test_reopened_after_external_rotation(self):
+        """
+        Without max_bytes the file is reopened once it was moved away.
+        """
+        handler = QueueFileHandler(self.path)
+        handler.setFormatter(JsonFormatter())
+        self.addCleanup(handler.stop)
+        self.handler, self.logger.handlers = handler, [handler]
+        self.logger.info("before")
+        handler.writer.stop()
+        os.rename(self.path, self.path + ".1")
+        handler.start()
+        self.logger.info("after")
+        self.assertEqual([record["message"] for record in self.read()], ["after"])
+        self.assertEqual([record["message"] for record in self.read(self.path + ".1")], ["before"])
+
+    def test_full_queue_drops_records(self):
+        """
+        A full queue drops records instead of blocking the caller.
+        """
+        handler = QueueFileHandler(self.path, queue_size=1)
+        handler.pid = os.getpid()  # no listener takes records off the queue
+        self.addCleanup(handler.stop)
+        self.logger.handlers = [handler]
+        self.logger.info("kept")
+        self.logger.info("dropped")
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "kept")
+        self.assertEqual(handler.dropped, 1)
@@ -0,0 +1,61 @@
+"""Test the request metrics middleware."""
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from mysite.middleware import summary
+from .test_voting import create_question
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True)
+class RequestMetricsTests(TestCase):
+    """Test the request metrics middleware."""
+
+    def setUp(self):
+        """Start from an empty summary."""
+        summary.clear()
+        self.addCleanup(summary.clear)
+
+    def test_server_timing_header(self):
+        """
+        Responses carry the database, template and total time of the request.
+        """
+        create_question("Q1", days=-1)
+        response = self.client.get(reverse("polls:index"))
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="[1-9]\d* queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_summary_by_url_name(self):
+        """
+        The summary counts requests and queries of each URL name.
+        """
+        question = create_question("Q1", days=-1)
+        self.client.get(reverse("polls:index"))
+        self.client.get(reverse("polls:index"))
+        self.client.get(reverse("polls:results", args=(question.id,)))
+        stats = summary.summary()
+        self.assertEqual(stats["polls:index"]["requests"], 2)
+        self.assertEqual(stats["polls:results"]["requests"], 1)
+        self.assertGreater(stats["polls:index"]["queries_mean"], 0)
+        self.assertGreater(stats["polls:index"]["template_ms_mean"], 0)
+
+    def test_metrics_view(self):
+        """
+        Staff users can read the summary, other users cannot.
+        """
+        User.objects.create_user(username="user", password="user")
+        User.objects.create_user(username="staff", password="staff", is_staff=True)
+        self.client.login(username="user", password="user")
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 302)
+        self.client.login(username="staff", password="staff")
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(set(response.json()), {"requests", "results_cache", "database_pools"})
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled(self):
+        """
+        When disabled, there is no header and nothing is recorded.
+        """
+        response = self.client.get(reverse("polls:index"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(summary.summary(), {})
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 302)
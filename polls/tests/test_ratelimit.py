@@ -0,0 +1,147 @@
+"""Test the rate limits of vote, login and signup and the load shedding."""
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from mysite import ratelimit
+from mysite.middleware import LoadSheddingMiddleware
+from mysite.ratelimit import TokenBuckets
+from polls.models import Choice
+from .test_voting import create_question
+
+
+class TokenBucketsTests(TestCase):
+    """Test the token buckets."""
+
+    def test_burst_then_refill(self):
+        """
+        A key gets its burst at once, then tokens at the refill rate.
+        """
+        buckets = TokenBuckets("2/m", max_keys=10)
+        self.assertEqual([buckets.take("a", now=0) for _ in range(3)], [0, 0, 30])
+        self.assertEqual(buckets.take("b", now=0), 0)
+        self.assertEqual(buckets.take("a", now=15), 15)
+        self.assertEqual(buckets.take("a", now=30), 0)
+
+    def test_eviction(self):
+        """
+        Only the most recently seen keys are kept.
+        """
+        buckets = TokenBuckets("1/h", max_keys=2)
+        for key in "abc":
+            buckets.take(key, now=0)
+        self.assertEqual(list(buckets.buckets), ["b", "c"])
+        self.assertEqual(buckets.take("a", now=0), 0)
+
+
+@override_settings(RATE_LIMITS_ENABLED=True, RATE_LIMITS={
+    "vote": {"ip": "3/m", "user": "2/m"},
+    "login": {"ip": "3/m", "user": "2/m"},
+    "signup": {"ip": "1/h"},
+})
+class RateLimitTests(TestCase):
+    """Test the rate limited views."""
+
+    def setUp(self):
+        """Forget the buckets of earlier tests and create a question."""
+        ratelimit.buckets.clear()
+        self.question = create_question("Question", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="Choice")
+        self.user = User.objects.create_user(username="voter", password="secret")
+
+    def vote(self, ip="10.0.0.1"):
+        """Post a vote from ip and return the response."""
+        return self.client.post(reverse("polls:vote", args=(self.question.id,)),
+                                {"choice": self.choice.id}, REMOTE_ADDR=ip)
+
+    def test_vote_limited_per_user(self):
+        """
+        A user over the limit gets 429 from any address.
+        """
+        self.client.force_login(self.user)
+        self.assertEqual([self.vote(ip).status_code for ip in ("10.0.0.1", "10.0.0.2")], [302, 302])
+        response = self.vote("10.0.0.3")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+
+    def test_vote_limited_per_ip_without_queries(self):
+        """
+        An address over the limit gets 429 before the database is touched.
+        """
+        for _ in range(3):
+            self.vote()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.vote().status_code, 429)
+        self.assertEqual(self.vote("10.0.0.2").status_code, 302)
+
+    def test_login_limited_per_username(self):
+        """
+        Guessing the password of one user is limited across addresses.
+        """
+        url = reverse("login")
+        codes = [self.client.post(url, {"username": "Voter", "password": "wrong"},
+                                  REMOTE_ADDR=f"10.0.0.{i}").status_code for i in range(3)]
+        self.assertEqual(codes, [200, 200, 429])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_signup_limited_per_ip(self):
+        """
+        Signups are limited per address.
+        """
+        data = {"username": "new", "password1": "a-Long-pass-42", "password2": "a-Long-pass-42"}
+        self.assertEqual(self.client.post(reverse("signup"), data).status_code, 302)
+        self.client.logout()
+        self.assertEqual(self.client.post(reverse("signup"), data).status_code, 429)
+
+    def test_forwarded_for_ignored_without_trusted_proxies(self):
+        """
+        A client cannot escape its limit by changing X-Forwarded-For.
+        """
+        url = reverse("signup")
+        data = {"username": "new", "password1": "a-Long-pass-42", "password2": "a-Long-pass-42"}
+        self.assertEqual(self.client.post(url, data, HTTP_X_FORWARDED_FOR="1.1.1.1").status_code, 302)
+        self.client.logout()
+        self.assertEqual(self.client.post(url, data, HTTP_X_FORWARDED_FOR="2.2.2.2").status_code, 429)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_client_ip_behind_trusted_proxy(self):
+        """
+        Behind one proxy the client is the last X-Forwarded-For entry.
+        """
+        factory = RequestFactory()
+        request = factory.get("/", HTTP_X_FORWARDED_FOR="6.6.6.6, 10.0.0.7", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(ratelimit.get_client_ip(request), "10.0.0.7")
+        self.assertEqual(ratelimit.get_client_ip(factory.get("/", REMOTE_ADDR="10.0.0.1")), "10.0.0.1")
+        with override_settings(TRUSTED_PROXY_COUNT=3):
+            self.assertEqual(ratelimit.get_client_ip(request), "10.0.0.1")
+
+    @override_settings(RATE_LIMITS_ENABLED=False)
+    def test_disabled(self):
+        """
+        Nothing is limited when RATE_LIMITS_ENABLED is off.
+        """
+        self.assertEqual({self.vote().status_code for _ in range(5)}, {302})
+
+
+class LoadSheddingTests(TestCase):
+    """Test the concurrency cap."""
+
+    @override_settings(MAX_CONCURRENT_REQUESTS=1)
+    def test_requests_beyond_the_cap_are_shed(self):
+        """
+        A request arriving while the process is full gets 503.
+        """
+        nested = []
+
+        def get_response(request):
+            if not nested:
+                nested.append(middleware(request))
+            return HttpResponse("ok")
+
+        middleware = LoadSheddingMiddleware(get_response)
+        request = RequestFactory().get("/")
+        self.assertEqual(middleware(request).status_code, 200)
+        self.assertEqual(nested[0].status_code, 503)
+        self.assertEqual(nested[0]["Retry-After"], "1")
+        self.assertEqual((middleware.in_flight, middleware.shed), (0, 1))
+        self.assertEqual(middleware(request).status_code, 200)
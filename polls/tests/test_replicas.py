@@ -0,0 +1,118 @@
+"""Test the routing of reads to read replicas."""
+import unittest
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mysite.routers import PIN_COOKIE, ReplicaRouter, replica_reads
+from polls.models import Choice, Question
+from .test_voting import create_question
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingTests(TestCase):
+    """Test which requests may read from a replica, without a replica."""
+
+    def setUp(self):
+        """Create an open question and a user, and watch replica picks."""
+        cache.clear()
+        self.question = create_question("Q1", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="C1")
+        self.user = User.objects.create_user(username="test1", password="test1",
+                                             is_staff=True, is_superuser=True)
+        patcher = mock.patch("mysite.routers.pick_replica", return_value="default")
+        self.pick_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_index_and_results_read_from_replica(self):
+        """
+        The index and results pages read the polls tables from a replica.
+        """
+        for url in (reverse("polls:index"), reverse("polls:results", args=(self.question.id,))):
+            self.pick_replica.reset_mock()
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertTrue(self.pick_replica.called, url)
+
+    def test_detail_reads_from_primary(self):
+        """
+        The detail page, which shows the user's own vote, reads from the primary.
+        """
+        self.client.force_login(self.user)
+        self.client.get(reverse("polls:detail", args=(self.question.id,)))
+        self.assertFalse(self.pick_replica.called)
+
+    def test_vote_pins_client_to_primary(self):
+        """
+        After a vote the client reads its results from the primary.
+        """
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("polls:vote", args=(self.question.id,)),
+                                    {"choice": self.choice.id}, follow=True)
+        self.assertEqual(response.context["question"].total_votes, 1)
+        self.assertEqual(self.client.cookies[PIN_COOKIE]["max-age"], settings.REPLICA_PIN_SECONDS)
+        self.assertFalse(self.pick_replica.called)
+
+    def test_pinned_client_skips_results_cache(self):
+        """
+        A pinned client does not get results a lagging replica may have cached.
+        """
+        url = reverse("polls:results", args=(self.question.id,))
+        self.client.get(url)
+        Choice.objects.filter(pk=self.choice.pk).update(vote_count=1)
+        self.assertEqual(self.client.get(url).context["question"].total_votes, 0)
+        self.client.cookies[PIN_COOKIE] = "1"
+        self.assertEqual(self.client.get(url).context["question"].total_votes, 1)
+
+    def test_admin_change_list_reads_from_replica(self):
+        """
+        The admin change lists read from a replica.
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("admin:polls_question_changelist"))
+        self.assertContains(response, "Q1")
+        self.assertTrue(self.pick_replica.called)
+
+    def test_router(self):
+        """
+        Only polls reads inside replica_reads go to a replica, writes never do.
+        """
+        router = ReplicaRouter()
+        request = mock.Mock(COOKIES={})
+        self.assertIsNone(router.db_for_read(Question))
+        with replica_reads(request):
+            self.assertEqual(router.db_for_read(Question), "default")
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual(router.db_for_write(Question), "default")
+        with replica_reads(mock.Mock(COOKIES={PIN_COOKIE: "1"})):
+            self.assertIsNone(router.db_for_read(Question))
+        self.assertFalse(router.allow_migrate("replica1", "polls"))
+        self.assertTrue(router.allow_migrate("default", "polls"))
+
+
+@unittest.skipUnless(settings.DATABASE_REPLICAS, "no read replica is configured")
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Test reads from a configured replica that mirrors the test database."""
+
+    databases = "__all__"
+
+    def test_index_reads_from_replica(self):
+        """
+        The index page queries the replica and the vote queries the primary.
+        """
+        question = create_question("Q1", days=-1)
+        choice = Choice.objects.create(question=question, choice_text="C1")
+        User.objects.create_user(username="test1", password="test1")
+        self.client.login(username="test1", password="test1")
+        replica = connections[settings.DATABASE_REPLICAS[0]]
+        with mock.patch("mysite.routers.pick_replica", return_value=replica.alias), \
+                CaptureQueriesContext(replica) as captured:
+            response = self.client.get(reverse("polls:index"))
+            self.assertContains(response, "Q1")
+            self.assertTrue(captured.captured_queries)
+            reads = len(captured.captured_queries)
+            self.client.post(reverse("polls:vote", args=(question.id,)), {"choice": choice.id})
+            self.assertEqual(len(captured.captured_queries), reads)
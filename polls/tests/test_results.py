@@ -0,0 +1,103 @@
+"""Test results page of polls app."""
+import tempfile
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from polls.cache import reset_results_cache_stats, results_cache_stats
+from polls.models import Choice
+from .test_voting import create_question
+
+
+class QuestionResultsViewTests(TestCase):
+    """Test results page of polls app."""
+
+    def setUp(self):
+        """Create a question with some voted choices."""
+        cache.clear()
+        self.question = create_question("Q1", days=-1)
+        for text, count in [("C1", 3), ("C2", 1), ("C3", 0)]:
+            Choice.objects.create(question=self.question, choice_text=text,
+                                  vote_count=count)
+
+    def test_vote_share(self):
+        """
+        Each choice carries its vote count and percentage, the question its total.
+        """
+        response = self.client.get(reverse("polls:results", args=(self.question.id,)))
+        question = response.context["question"]
+        self.assertEqual(question.total_votes, 4)
+        shares = [(c.choice_text, c.vote_count, c.percentage) for c in question.choice_set.all()]
+        self.assertEqual(shares, [("C1", 3, 75.0), ("C2", 1, 25.0), ("C3", 0, 0.0)])
+        self.assertContains(response, "75.0%")
+
+    def test_no_votes(self):
+        """
+        A question without votes shows zero percent instead of failing.
+        """
+        question = create_question("Q2", days=-1)
+        Choice.objects.create(question=question, choice_text="C1")
+        response = self.client.get(reverse("polls:results", args=(question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "0.0%")
+
+    def test_query_count_does_not_grow_with_choices(self):
+        """
+        The results page loads the question and all choices in two queries.
+        """
+        for i in range(20):
+            Choice.objects.create(question=self.question, choice_text=f"extra {i}")
+        with self.assertNumQueries(2):
+            self.client.get(reverse("polls:results", args=(self.question.id,)))
+
+
+class ResultsCacheTests(TestCase):
+    """Test the versioned results cache."""
+
+    def setUp(self):
+        """Create a question with two choices and reset the cache."""
+        cache.clear()
+        reset_results_cache_stats()
+        self.question = create_question("Q1", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="C1")
+        self.url = reverse("polls:results", args=(self.question.id,))
+
+    def test_second_request_is_served_from_cache(self):
+        """
+        Once the results are cached, rendering them needs no query.
+        """
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context["question"].total_votes, 0)
+        stats = results_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_vote_invalidates_cached_results(self):
+        """
+        A recorded vote bumps the version so the next request sees it.
+        """
+        self.client.get(self.url)
+        User.objects.create_user(username="test1", password="test1")
+        self.client.login(username="test1", password="test1")
+        vote_url = reverse("polls:vote", args=(self.question.id,))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(vote_url, {"choice": self.choice.id})
+        response = self.client.get(self.url)
+        self.assertEqual(response.context["question"].total_votes, 1)
+
+    def test_file_based_cache(self):
+        """
+        The cache also works with the file-based backend.
+        """
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": location,
+            }
+        }):
+            self.client.get(self.url)
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url)
+        self.assertContains(response, self.choice.choice_text)
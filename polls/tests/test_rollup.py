@@ -0,0 +1,136 @@
+"""Test the hourly vote rollup and the vote history endpoint."""
+import datetime
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from polls.models import Choice, Vote, VoteRollup
+from polls.rollup import refresh_rollup, refreshed_until
+from polls.voting import record_vote
+from .test_voting import create_question
+
+
+class VoteRollupTests(TestCase):
+    """Test the timestamps of votes and the incremental rollup."""
+
+    def setUp(self):
+        """Create a question with two choices."""
+        self.question = create_question("Question", days=-1)
+        self.yes = Choice.objects.create(question=self.question, choice_text="Yes")
+        self.no = Choice.objects.create(question=self.question, choice_text="No")
+        self.hour = timezone.now().replace(minute=0, second=0, microsecond=0) - datetime.timedelta(hours=3)
+
+    def vote(self, choice, minutes, username=None):
+        """Record a vote for choice and move it to minutes after self.hour."""
+        user, _ = User.objects.get_or_create(username=username or f"voter{User.objects.count()}")
+        record_vote(user, choice)
+        Vote.objects.filter(user=user, question=choice.question).update(
+            voted_at=self.hour + datetime.timedelta(minutes=minutes))
+        return user
+
+    def rollup(self):
+        """Return the rollup as (minutes after self.hour, choice, votes)."""
+        return [(int((hour - self.hour).total_seconds() // 60), choice_id, votes) for hour, choice_id, votes in
+                VoteRollup.objects.order_by("hour", "choice_id").values_list("hour", "choice_id", "votes")]
+
+    def test_voted_at(self):
+        """
+        A vote records when it was cast and when it was changed.
+        """
+        user = User.objects.create_user(username="voter")
+        record_vote(user, self.yes)
+        cast = Vote.objects.get(user=user).voted_at
+        self.assertIsNotNone(cast)
+        record_vote(user, self.no)
+        self.assertGreater(Vote.objects.get(user=user).voted_at, cast)
+
+    def test_counts_per_hour_and_choice(self):
+        """
+        Votes are counted per hour and choice.
+        """
+        self.vote(self.yes, 5)
+        self.vote(self.yes, 50)
+        self.vote(self.no, 70)
+        self.assertEqual(refresh_rollup(), 3)
+        self.assertEqual(self.rollup(), [(0, self.yes.id, 2), (60, self.no.id, 1)])
+
+    def test_incremental_refresh(self):
+        """
+        A refresh only adds the votes cast or changed after the last one.
+        """
+        self.vote(self.yes, 5, "first")
+        refresh_rollup(until=self.hour + datetime.timedelta(minutes=10))
+        self.vote(self.yes, 20)
+        self.vote(self.no, 90, "first")
+        self.assertEqual(refresh_rollup(until=self.hour + datetime.timedelta(minutes=30)), 1)
+        self.assertEqual(self.rollup(), [(0, self.yes.id, 2)])
+        self.assertEqual(refresh_rollup(), 1)
+        self.assertEqual(self.rollup(), [(0, self.yes.id, 2), (60, self.no.id, 1)])
+        self.assertEqual(refresh_rollup(), 0)
+
+    def test_recent_votes_wait_for_the_next_refresh(self):
+        """
+        Votes younger than ROLLUP_LAG are left for the next refresh.
+        """
+        record_vote(User.objects.create_user(username="voter"), self.yes)
+        with self.settings(ROLLUP_LAG=60):
+            self.assertEqual(refresh_rollup(), 0)
+        with self.settings(ROLLUP_LAG=0):
+            self.assertEqual(refresh_rollup(), 1)
+
+    def test_command(self):
+        """
+        The command refreshes or rebuilds the rollup.
+        """
+        self.vote(self.yes, 5)
+        out = StringIO()
+        call_command("rollup_votes", stdout=out)
+        self.assertIn("Added 1 vote(s)", out.getvalue())
+        call_command("rollup_votes", "--rebuild", stdout=out)
+        self.assertIn("Added 1 vote(s)", out.getvalue().splitlines()[-1])
+        self.assertEqual(self.rollup(), [(0, self.yes.id, 1)])
+
+
+class HistoryViewTests(TestCase):
+    """Test the vote history endpoint."""
+
+    def setUp(self):
+        """Create a question with a rolled up vote."""
+        self.question = create_question("Question", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="Yes")
+        Choice.objects.create(question=self.question, choice_text="No")
+        record_vote(User.objects.create_user(username="voter"), self.choice)
+        refresh_rollup(until=timezone.now())
+
+    def test_history_reads_the_rollup(self):
+        """
+        The history has a series per choice and never reads the Vote table.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("polls:history", args=(self.question.id,)))
+        self.assertFalse(any('"polls_vote"' in query["sql"] for query in queries))
+        data = response.json()
+        self.assertTrue(data["refreshed_until"].startswith(f"{refreshed_until():%Y-%m-%dT%H:%M:%S}"))
+        self.assertEqual([(choice["choice"], [point["votes"] for point in choice["votes"]])
+                          for choice in data["choices"]], [("Yes", [1]), ("No", [])])
+
+    def test_window(self):
+        """
+        Hours before the requested window are left out.
+        """
+        VoteRollup.objects.update(hour=timezone.now() - datetime.timedelta(hours=5))
+        response = self.client.get(reverse("polls:history", args=(self.question.id,)), {"hours": 2})
+        self.assertEqual(response.json()["choices"][0]["votes"], [])
+
+    def test_invalid(self):
+        """
+        Unknown questions and invalid windows are 404.
+        """
+        future = create_question("Future", days=1)
+        self.assertEqual(self.client.get(reverse("polls:history", args=(future.id,))).status_code, 404)
+        response = self.client.get(reverse("polls:history", args=(self.question.id,)), {"hours": "x"})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,85 @@
+"""Test the precomputed poll schedule."""
+import datetime
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from polls.models import Question
+from polls.schedule import current_schedule
+from .test_voting import create_question
+
+
+@override_settings(SCHEDULE_MAX_AGE=24 * 3600)
+class PollScheduleTests(TestCase):
+    """Test the open status and boundaries of the poll schedule."""
+
+    def setUp(self):
+        """Create an open, a closed, a closing and a future question."""
+        self.now = timezone.now()
+        self.open = create_question("Open", days=-2)
+        self.closed = Question.objects.create(question_text="Closed", published_date=self.now - datetime.timedelta(days=2),
+                                              end_date=self.now - datetime.timedelta(days=1))
+        self.closing = Question.objects.create(question_text="Closing", published_date=self.now - datetime.timedelta(days=2),
+                                               end_date=self.now + datetime.timedelta(hours=1))
+        self.future = create_question("Future", hours=2)
+
+    def test_status(self):
+        """
+        The schedule agrees with can_vote() and is_published().
+        """
+        schedule = current_schedule(self.now)
+        for question in (self.open, self.closed, self.closing, self.future):
+            self.assertEqual(schedule.is_open(question.pk), question.can_vote(), question)
+            self.assertEqual(schedule.is_published(question.pk), question.is_published(), question)
+        self.assertEqual(schedule.valid_until, self.closing.end_date + datetime.timedelta(microseconds=1))
+
+    def test_no_queries_between_boundaries(self):
+        """
+        Lookups between two boundaries do not query the database.
+        """
+        current_schedule(self.now)
+        with self.assertNumQueries(0):
+            schedule = current_schedule(self.now + datetime.timedelta(minutes=59))
+        self.assertTrue(schedule.is_open(self.closing.pk))
+
+    def test_rebuilt_at_boundaries(self):
+        """
+        A question closes just after its end date and opens at its published date.
+        """
+        end = self.closing.end_date
+        self.assertTrue(current_schedule(end).is_open(self.closing.pk))
+        self.assertFalse(current_schedule(end + datetime.timedelta(microseconds=1)).is_open(self.closing.pk))
+        schedule = current_schedule(self.future.published_date)
+        self.assertTrue(schedule.is_open(self.future.pk))
+        self.assertEqual(schedule.valid_until, self.future.published_date + datetime.timedelta(days=1))
+
+    def test_rebuilt_when_a_question_is_saved(self):
+        """
+        Saving or deleting a question rebuilds the schedule.
+        """
+        current_schedule(self.now)
+        self.open.end_date = self.now - datetime.timedelta(minutes=1)
+        self.open.save()
+        self.assertFalse(current_schedule(self.now).is_open(self.open.pk))
+        added = create_question("Added", days=-1)
+        self.assertTrue(current_schedule(self.now).is_open(added.pk))
+        added.delete()
+        self.assertFalse(current_schedule(self.now).is_open(added.pk))
+
+    @override_settings(SCHEDULE_MAX_AGE=5)
+    def test_rebuilt_after_max_age(self):
+        """
+        A schedule is rebuilt after SCHEDULE_MAX_AGE even if its version was not bumped.
+        """
+        current_schedule(self.now)
+        Question.objects.filter(pk=self.open.pk).update(end_date=self.now)
+        self.assertTrue(current_schedule(self.now + datetime.timedelta(seconds=4)).is_open(self.open.pk))
+        self.assertFalse(current_schedule(self.now + datetime.timedelta(seconds=5)).is_open(self.open.pk))
+
+    def test_open_polls_listing(self):
+        """
+        The open polls listing comes from the schedule without a query.
+        """
+        current_schedule()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("polls:open_polls"))
+        self.assertEqual([question["question"] for question in response.json()["questions"]], ["Open", "Closing"])
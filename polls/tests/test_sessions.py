@@ -0,0 +1,70 @@
+"""Test sessions, messages and the cached user of authenticated requests."""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from polls.models import Choice
+from .test_voting import create_question
+
+
+class SessionQueriesTests(TestCase):
+    """Test the queries authenticated requests make on sessions and users."""
+
+    def setUp(self):
+        """Create a question and a user."""
+        cache.clear()
+        self.question = create_question("Question", days=-1)
+        self.choice = Choice.objects.create(question=self.question, choice_text="Choice")
+        self.user = User.objects.create_user(username="voter", password="secret")
+
+    def tables_queried(self, method, url, data=None):
+        """Return the SQL of the queries on sessions and users of one request."""
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertIn(response.status_code, (200, 302))
+        return [query["sql"] for query in queries
+                if "django_session" in query["sql"] or "auth_user" in query["sql"]]
+
+    def test_cached_user(self):
+        """
+        The user of a session is loaded once and then read from the cache.
+        """
+        self.client.force_login(self.user)
+        index = reverse("polls:index")
+        self.assertTrue(any("auth_user" in sql for sql in self.tables_queried("get", index)))
+        self.assertFalse(any("auth_user" in sql for sql in self.tables_queried("get", index)))
+
+    def test_password_change_ends_cached_sessions(self):
+        """
+        Saving the user drops it from the cache, so old sessions end.
+        """
+        self.client.force_login(self.user)
+        self.client.get(reverse("polls:index"))
+        self.user.set_password("changed")
+        self.user.save()
+        response = self.client.get(reverse("polls:index"))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_signed_cookie_sessions(self):
+        """
+        With signed cookie sessions and a cached user, pages need neither table.
+        """
+        self.client.login(username="voter", password="secret")
+        for url in (reverse("polls:index"), reverse("polls:detail", args=(self.question.id,)),
+                    reverse("polls:results", args=(self.question.id,))):
+            self.client.get(url)
+            self.assertEqual(self.tables_queried("get", url), [], url)
+
+    def test_vote_does_not_write_session(self):
+        """
+        The vote message goes to a cookie instead of the session.
+        """
+        self.client.force_login(self.user)
+        self.client.get(reverse("polls:index"))
+        queries = self.tables_queried("post", reverse("polls:vote", args=(self.question.id,)),
+                                      {"choice": self.choice.id})
+        self.assertEqual([sql for sql in queries if "django_session" in sql and not sql.startswith("SELECT")], [])
+        self.assertIn("messages", self.client.cookies)
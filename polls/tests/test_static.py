@@ -0,0 +1,41 @@
+"""Test the hashed, precompressed static files."""
+import tempfile
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from .test_voting import create_question
+
+
+class StaticFilesTests(TestCase):
+    """Test the hashed, precompressed static files."""
+
+    def test_pages_link_shared_css(self):
+        """
+        The pages link the shared style sheets instead of inlining them.
+        """
+        question = create_question("Q1", days=-1)
+        for url in (reverse("polls:index"), reverse("polls:results", args=(question.id,)),
+                    reverse("polls:detail", args=(question.id,)), reverse("login")):
+            response = self.client.get(url)
+            self.assertNotContains(response, "<style>")
+            self.assertContains(response, '<link rel="stylesheet"')
+
+    def test_collected_files_are_hashed_compressed_and_immutable(self):
+        """
+        Collected files get hashed names and compressed copies, served by
+        Accept-Encoding with a far-future immutable Cache-Control header.
+        """
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            call_command("collectstatic", interactive=False, verbosity=0, ignore_patterns=["admin"])
+            url = staticfiles_storage.url("polls/style.css")
+            self.assertRegex(url, r"/polls/style\.[0-9a-f]{12}\.css$")
+            for encoding in ("br", "gzip"):
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+                self.assertEqual(response["Content-Encoding"], encoding)
+                self.assertIn("immutable", response["Cache-Control"])
+                self.assertEqual(response["Vary"], "Accept-Encoding")
+                response.close()
+            response = self.client.get(url)
+            self.assertNotIn("Content-Encoding", response)
+            self.assertIn(b"floral_background.", b"".join(response.streaming_content))
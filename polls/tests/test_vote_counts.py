@@ -0,0 +1,163 @@
+"""Test the stored vote counter of each choice."""
+import threading
+import unittest
+from io import StringIO
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from polls.models import Choice, Vote
+from polls.voting import record_vote, record_votes
+from .test_voting import create_question
+
+
+class VoteCountTests(TestCase):
+    """Test that voting keeps Choice.vote_count in step with Vote."""
+
+    def setUp(self):
+        """Create a question with two choices and log a user in."""
+        self.question = create_question("Q1", days=-1)
+        self.choice1 = Choice.objects.create(question=self.question, choice_text="C1")
+        self.choice2 = Choice.objects.create(question=self.question, choice_text="C2")
+        self.user = User.objects.create_user(username="test1", password="test1")
+        self.client.login(username="test1", password="test1")
+
+    def vote_for(self, choice):
+        """Post a vote for choice as the logged in user."""
+        url = reverse("polls:vote", args=(self.question.id,))
+        return self.client.post(url, {"choice": choice.id})
+
+    def test_first_vote_increments_counter(self):
+        """
+        The first vote of a user increments the counter of the chosen choice.
+        """
+        self.vote_for(self.choice1)
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 1)
+
+    def test_changed_vote_moves_counter(self):
+        """
+        Changing a vote moves one count from the old choice to the new one.
+        """
+        self.vote_for(self.choice1)
+        self.vote_for(self.choice2)
+        self.choice1.refresh_from_db()
+        self.choice2.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 0)
+        self.assertEqual(self.choice2.votes, 1)
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_same_vote_twice_counts_once(self):
+        """
+        Voting for the same choice again does not change the counter.
+        """
+        self.vote_for(self.choice1)
+        self.vote_for(self.choice1)
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 1)
+
+    def test_recount_votes_repairs_drift(self):
+        """
+        The recount_votes command rebuilds counters from the Vote table.
+        """
+        Vote.objects.create(user=self.user, choice=self.choice1)
+        Choice.objects.filter(pk=self.choice2.pk).update(vote_count=5)
+        call_command("recount_votes", stdout=StringIO())
+        self.choice1.refresh_from_db()
+        self.choice2.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 1)
+        self.assertEqual(self.choice2.votes, 0)
+
+    def test_one_vote_per_user_per_question(self):
+        """
+        The database refuses a second vote row for the same user and question.
+        """
+        Vote.objects.create(user=self.user, choice=self.choice1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vote.objects.create(user=self.user, choice=self.choice2)
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.choice1)
+
+    def test_vote_for_choice_of_other_question(self):
+        """
+        A choice that belongs to another question is not accepted.
+        """
+        other = create_question("Q2", days=-1)
+        other_choice = Choice.objects.create(question=other, choice_text="C3")
+        response = self.vote_for(other_choice)
+        self.assertContains(response, "You didn&#x27;t select a choice.")
+        self.assertFalse(Vote.objects.exists())
+
+    def test_deleted_user_votes_leave_counters(self):
+        """
+        Deleting a user takes their votes off the counters.
+        """
+        other = User.objects.create_user(username="test2")
+        record_vote(self.user, self.choice1)
+        record_vote(other, self.choice1)
+        self.user.delete()
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 1)
+        Vote.objects.all().delete()
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 0)
+
+    def test_voter_locked_before_votes_are_read(self):
+        """
+        The voter's row is locked before their previous votes are read.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            record_vote(self.user, self.choice1)
+        sql = [query["sql"] for query in queries if "SAVEPOINT" not in query["sql"]]
+        self.assertIn('FROM "auth_user"', sql[0])
+        self.assertIn('FROM "polls_vote"', sql[1])
+        if connection.features.has_select_for_update:
+            self.assertIn("FOR UPDATE", sql[0])
+
+    def test_upsert_onto_existing_vote(self):
+        """
+        A batch whose vote conflicts with a stored one moves the counter.
+        """
+        record_vote(self.user, self.choice1)
+        written = record_votes([Vote(user=self.user, question=self.question, choice=self.choice2),
+                                Vote(user=self.user, question=self.question, choice=self.choice1)])
+        self.assertEqual(written, 0)
+        written = record_votes([Vote(user=self.user, question=self.question, choice=self.choice2)])
+        self.assertEqual(written, 1)
+        self.assertEqual(list(Choice.objects.order_by("pk").values_list("vote_count", flat=True)), [0, 1])
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.choice2)
+
+
+@unittest.skipUnless(connection.features.has_select_for_update, "the database cannot lock rows")
+class ConcurrentVoteTests(TransactionTestCase):
+    """Test first votes of the same user submitted at the same time."""
+
+    def setUp(self):
+        """Create a question with two choices and a user."""
+        self.question = create_question("Q1", days=-1)
+        self.choices = [Choice.objects.create(question=self.question, choice_text=text)
+                        for text in ("C1", "C2")]
+        self.user = User.objects.create_user(username="test1")
+
+    def test_concurrent_first_votes_count_once(self):
+        """
+        Two first votes at once record one vote and count it once.
+        """
+        barrier = threading.Barrier(2)
+
+        def vote(choice):
+            try:
+                barrier.wait()
+                record_vote(self.user, choice)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=vote, args=(choice,)) for choice in self.choices]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        vote = Vote.objects.get(user=self.user)
+        counts = dict(Choice.objects.values_list("pk", "vote_count"))
+        self.assertEqual(counts, {choice.pk: int(choice == vote.choice) for choice in self.choices})
@@ -1,11 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, export, views
 
 
 app_name = "polls"
-urlpatterns = [
+sync_urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
-    path("<int:pk>/", views.check_valid_question, name="detail"),
+    path("<int:pk>/", views.DetailView.as_view(), name="detail"),
     path("<int:pk>/results/", views.ResultsView.as_view(), name="results"),
     path("<int:question_id>/vote/", views.vote, name="vote"),
 ]
+async_urlpatterns = [
+    path('', views.IndexView.as_view(), name='index'),
+    path("<int:pk>/", async_views.check_valid_question, name="detail"),
+    path("<int:pk>/results/", async_views.results, name="results"),
+    path("<int:pk>/results/stream/", async_views.results_stream,
+         name="results_stream"),
+    path("<int:question_id>/vote/", async_views.vote, name="vote"),
+]
+shared_urlpatterns = [
+    path("open/", views.open_polls, name="open_polls"),
+    path("ballot/", views.ballot, name="ballot"),
+    path("<int:pk>/history/", views.history, name="history"),
+    path("export/results.<str:fmt>", export.results, name="export_results"),
+    path("export/votes.<str:fmt>", export.votes, name="export_votes"),
+]
+sync_urlpatterns += shared_urlpatterns
+async_urlpatterns += shared_urlpatterns
+urlpatterns = async_urlpatterns if settings.ASYNC_VIEWS else sync_urlpatterns
@@ -1,29 +1,100 @@
 """Contain request handler view."""
 import logging
-from django.http import HttpResponseRedirect, Http404
+import datetime
+import json
+from django.http import HttpResponseRedirect, Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.urls import reverse
 from django.views import generic
 from django.contrib.auth.decorators import login_required
+from django.db.models import (F, FloatField, OuterRef, Prefetch, Subquery, Sum,
+                              Window, prefetch_related_objects)
+from django.db.models.functions import Coalesce, NullIf
 from django.utils import timezone
-from mysite import settings
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_POST
+from django.conf import settings
+from mysite.ratelimit import rate_limit
+from mysite.routers import is_pinned, read_from_replica, reading_from_replica
 from .models import Question, Choice, Vote
+from .pagination import encode_cursor, paginate_after
+from .cache import get_results, results_version, set_results
+from .conditional import is_conditional, not_modified, page_etag, set_validators
+from .ingest import accept_vote, wait_for_pending
+from .rollup import refreshed_until, vote_history
+from .schedule import current_schedule
+from .voting import record_votes
 
 
 logger = logging.getLogger("polls")
 
 
+@method_decorator(read_from_replica, name="dispatch")
 class IndexView(generic.ListView):
     """Home page view of polls app that show all available questions."""
 
     template_name = "polls/index.html"
     context_object_name = "latest_question_list"
+    page_size = 20
 
     def get_queryset(self):
-        """Return all published question."""
-        return Question.objects.filter(published_date__lte=timezone.now()).\
-            order_by('published_date')
+        """Return one page of published questions."""
+        questions = Question.objects.published()
+        return paginate_after(questions, self.request.GET.get("after"),
+                              self.page_size)
+
+    def get(self, request, *args, **kwargs):
+        """Load the page and answer 304 if the client already has it."""
+        self.object_list = self.get_queryset()
+        questions = list(self.object_list)
+        schedule = current_schedule()
+        for question in questions:
+            question.is_open = schedule.is_open(question.pk)
+        etag, last_modified = None, None
+        if questions:
+            etag = page_etag(request, "index", *(
+                (question.pk, question.last_modified.timestamp(), question.is_open)
+                for question in questions))
+            # A question also changes the page when it is published or closes.
+            # A question missing from a stale schedule may not have closed.
+            now = timezone.now()
+            last_modified = max(
+                [question.last_modified for question in questions]
+                + [question.published_date for question in questions]
+                + [question.end_date for question in questions
+                   if not question.is_open and question.end_date is not None and question.end_date <= now])
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = self.render_to_response(self.get_context_data())
+        return set_validators(request, response, etag, last_modified)
+
+    def get_context_data(self, **kwargs):
+        """Cut the page to page_size and add the cursor of the next page."""
+        questions = list(self.object_list)
+        page = questions[:self.page_size]
+        kwargs["object_list"] = page
+        context = super().get_context_data(**kwargs)
+        context["next_cursor"] = encode_cursor(page[-1]) \
+            if len(questions) > self.page_size else None
+        return context
+
+
+def detail_queryset(user):
+    """Return questions with the id of the choice user voted for, if any."""
+    questions = Question.objects.all()
+    if user.is_authenticated:
+        questions = questions.annotate(user_choice_id=Subquery(
+            Vote.objects.filter(user=user, question=OuterRef("pk")).
+            values("choice_id")[:1]))
+    return questions
+
+
+def voted_choice(question):
+    """Return the choice of question marked by detail_queryset, if any."""
+    choice_id = getattr(question, "user_choice_id", None)
+    return next((choice for choice in question.choice_set.all()
+                 if choice.pk == choice_id), None)
 
 
 class DetailView(generic.DetailView):
@@ -33,70 +104,278 @@ class DetailView(generic.DetailView):
     template_name = "polls/detail.html"
 
     def get_queryset(self):
-        """Return all published question."""
-        return Question.objects.filter(published_date__lte=timezone.now())
+        """Return questions with the choice the user voted for."""
+        return detail_queryset(self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        """Show the question if it is open for voting, else go to index."""
+        user = request.user
+        pk = self.kwargs[self.pk_url_kwarg]
+        wait_for_pending(user, pk)
+        try:
+            self.object = self.get_object()
+        except Http404:
+            messages.error(request, "The question doesn't exist")
+            logger.error("%s try to access question that does not exist", user.username,
+                         extra={"event": "question_missing", "user": user.username, "question": pk})
+            return redirect(reverse('polls:index'))
+        if not current_schedule().is_open(self.object.pk):
+            messages.error(request, "Voting is not allowed for this question.")
+            logger.error("%s try to access unavailable question", user.username,
+                         extra={"event": "question_closed", "user": user.username, "question": pk})
+            return redirect(reverse('polls:index'))
+        prefetch_related_objects([self.object], "choice_set")
+        return self.render_to_response(self.get_context_data(object=self.object))
 
     def get_context_data(self, **kwargs):
         """Get context that used for checking radio button."""
         context = super().get_context_data(**kwargs)
-        try:
-            user_vote = Vote.objects.get(user=self.request.user,
-                                         choice__question=self.object)
-            context["user_vote"] = user_vote.choice
-        except (Vote.DoesNotExist, TypeError):
-            context["user_vote"] = None
+        context["user_vote"] = voted_choice(self.object)
         return context
 
 
+def replica_timeout():
+    """
+    Return how long results read now may be cached, None for the default.
+
+    A replica can lag behind a vote whose version bump is already visible,
+    so results read from one are only kept for the pin window.
+    """
+    return settings.REPLICA_PIN_SECONDS if reading_from_replica() else None
+
+
+def cached_results_allowed(request):
+    """
+    Return True if the request may be answered from the results cache.
+
+    A pinned client has just voted, and another visitor may have cached
+    results read from a replica without that vote under the new version, so
+    it reads from the primary until the pin expires.
+    """
+    return not is_pinned(request)
+
+
+def choices_with_percentage():
+    """Return choices with their percentage of the votes on their question."""
+    question_total = Window(Sum("vote_count"),
+                            partition_by=[F("question_id")])
+    return Choice.objects.annotate(question_total=question_total).\
+        annotate(percentage=Coalesce(
+            F("vote_count") * 100.0 / NullIf(F("question_total"), 0),
+            0.0, output_field=FloatField())).order_by("pk")
+
+
+def results_queryset():
+    """Return questions with total votes and their choices' vote share."""
+    choices = choices_with_percentage()
+    return Question.objects.\
+        annotate(total_votes=Coalesce(Sum("choice__vote_count"), 0)).\
+        prefetch_related(Prefetch("choice_set", queryset=choices))
+
+
+@method_decorator(read_from_replica, name="dispatch")
 class ResultsView(generic.DetailView):
     """Show the question text and all vote count of each choice."""
 
     model = Question
     template_name = "polls/results.html"
 
+    def get_queryset(self):
+        """Return question with total votes and its choices' vote share."""
+        return results_queryset()
+
+    def get(self, request, *args, **kwargs):
+        """
+        Answer 304 if the client already has the results, else load them.
 
+        On a results cache miss a conditional request only reads the
+        question's last modified time before the check, so a 304 does not
+        compute the vote shares.
+        """
+        pk = self.kwargs[self.pk_url_kwarg]
+        wait_for_pending(request.user, pk)
+        version = results_version(pk)
+        self.object = get_results(pk, version) if cached_results_allowed(request) else None
+        if self.object is None and not is_conditional(request):
+            self.object = self.load_results(pk, version)
+        last_modified = self.object.last_modified if self.object is not None else question_last_modified(pk)
+        etag = page_etag(request, "results", pk, last_modified.timestamp())
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        if self.object is None:
+            self.object = self.load_results(pk, version)
+            last_modified = self.object.last_modified
+            etag = page_etag(request, "results", pk, last_modified.timestamp())
+        response = self.render_to_response(self.get_context_data(object=self.object))
+        return set_validators(request, response, etag, last_modified)
+
+    def load_results(self, pk, version):
+        """Load the results of the question and cache them under version."""
+        question = self.get_object()
+        set_results(pk, version, question, replica_timeout())
+        return question
+
+
+def question_last_modified(pk):
+    """Return the last modified time of a question, or raise Http404."""
+    last_modified = Question.objects.filter(pk=pk).values_list("last_modified", flat=True).first()
+    if last_modified is None:
+        raise Http404("No question found matching the query")
+    return last_modified
+
+
+def open_polls(request):
+    """Return the questions open for voting as JSON, from the poll schedule."""
+    return JsonResponse({"questions": [
+        {"question_id": question_id, "question": text, "end_date": end_date}
+        for question_id, text, end_date in current_schedule().open_questions]})
+
+
+@read_from_replica
+def history(request, pk):
+    """
+    Return the votes per hour of each choice of a question as JSON.
+
+    Only the hourly rollup is read, for the last ?hours=N hours (48 by
+    default). Votes newer than refreshed_until are not counted yet.
+    """
+    hours = request.GET.get("hours", "48")
+    if not hours.isdigit():
+        raise Http404("Invalid number of hours.")
+    hours = min(max(int(hours), 1), settings.HISTORY_MAX_HOURS)
+    question = get_object_or_404(Question.objects.published(), pk=pk)
+    since = timezone.now().replace(minute=0, second=0, microsecond=0) - \
+        datetime.timedelta(hours=hours - 1)
+    series = vote_history(question.pk, since)
+    return JsonResponse({
+        "question_id": question.pk,
+        "since": since,
+        "refreshed_until": refreshed_until(),
+        "choices": [{
+            "choice_id": choice.pk,
+            "choice": choice.choice_text,
+            "votes": [{"hour": hour, "votes": votes} for hour, votes in series.get(choice.pk, [])],
+        } for choice in question.choice_set.order_by("pk")],
+    })
+
+
+@rate_limit("vote")
 @login_required
 def vote(request, question_id):
     """Vote for a choice on a question (poll)."""
-    question = get_object_or_404(Question, pk=question_id)
     user = request.user
     if not user.is_authenticated:
         return redirect(f"{settings.LOGIN_URL}?next={request.path}")
     try:
-        selected_choice = question.choice_set.get(pk=request.POST['choice'])
-    except (KeyError, Choice.DoesNotExist):
+        selected_choice = Choice.objects.select_related("question").\
+            get(pk=request.POST['choice'], question_id=question_id)
+    except (KeyError, ValueError, Choice.DoesNotExist):
+        question = get_object_or_404(Question, pk=question_id)
         messages.error(request, "You didn't select a choice.")
-        logger.error(f"{user.username} didn't select a choice.")
+        logger.error("%s didn't select a choice.", user.username,
+                     extra={"event": "no_choice", "user": user.username, "question": question_id})
         return render(request, "polls/detail.html", {
             "question": question})
-    prev_vote = Vote.objects.filter(choice__question=question, user=user)
-    if prev_vote:
-        prev_vote = prev_vote[0]
-        prev_vote.choice = selected_choice
-        prev_vote.save()
-    else:
-        new_vote = Vote.objects.create(user=user, choice=selected_choice)
-        new_vote.save()
+    accept_vote(user, selected_choice)
     messages.info(request,
                   f"Your vote for "
                   f"{selected_choice.choice_text} has been recorded")
-    logger.info(f"{user.username} vote for "
-                f"{selected_choice.choice_text} has been recorded")
-    return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
+    logger.info("%s vote for %s has been recorded", user.username, selected_choice.choice_text,
+                extra={"event": "vote", "user": user.username, "question": question_id,
+                       "choice": selected_choice.id})
+    return HttpResponseRedirect(reverse('polls:results', args=(question_id,)))
+
+
+# Largest id a bigint primary key can hold
+MAX_ID = 2 ** 63 - 1
 
 
-def check_valid_question(request, pk):
-    """For checking validation before allowing to access detail view."""
+def ballot_id(value):
+    """Return value if it is a JSON integer that can be an id, else raise ValueError."""
+    if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= MAX_ID:
+        raise ValueError(f"Not an id: {value!r}")
+    return value
+
+
+def parse_ballot(request):
+    """
+    Return the (question id, choice id) pairs of a JSON ballot.
+
+    An item that is not a pair of ids is None. Raise ValueError if the body
+    is not a ballot or has more than BALLOT_MAX_VOTES items.
+    """
+    try:
+        items = json.loads(request.body)["votes"]
+    except (KeyError, TypeError) as error:
+        raise ValueError("Not a ballot.") from error
+    if not isinstance(items, list) or len(items) > settings.BALLOT_MAX_VOTES:
+        raise ValueError("Not a ballot.")
+    pairs = []
+    for item in items:
+        try:
+            pairs.append((ballot_id(item["question"]), ballot_id(item["choice"])))
+        except (KeyError, TypeError, ValueError):
+            pairs.append(None)
+    return pairs
+
+
+def ballot_errors(pairs):
+    """
+    Return the error of each pair of a ballot, None for the valid ones.
+
+    Open questions are looked up in the poll schedule and the choices of
+    the whole ballot are read in one query.
+    """
+    schedule = current_schedule()
+    choice_ids = {pair[1] for pair in pairs if pair is not None}
+    question_of = dict(Choice.objects.filter(pk__in=choice_ids).values_list("pk", "question_id"))
+    seen = set()
+    errors = []
+    for pair in pairs:
+        if pair is None:
+            errors.append("Give the id of a question and of a choice.")
+        elif pair[0] in seen:
+            errors.append("The question is in the ballot more than once.")
+        elif not schedule.is_open(pair[0]):
+            errors.append("Voting is not allowed for this question.")
+        elif question_of.get(pair[1]) != pair[0]:
+            errors.append("The choice is not one of the question's choices.")
+        else:
+            errors.append(None)
+        if pair is not None:
+            seen.add(pair[0])
+    return errors
+
+
+@rate_limit("ballot")
+@require_POST
+def ballot(request):
+    """
+    Vote on many questions at once and return the result of each vote.
+
+    The body is {"votes": [{"question": id, "choice": id}, ...]}. The valid
+    votes are written together in one transaction by record_votes(), the
+    others are rejected with the reason in their result.
+    """
     user = request.user
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Log in to vote."}, status=401)
     try:
-        question = get_object_or_404(Question, pk=pk)
-        if question.can_vote():
-            return DetailView.as_view()(request, pk=pk)
-        messages.error(request, "Voting is not allowed for this question.")
-        logger.error(f"{user.username} try to access unavailable question")
-        return redirect(reverse('polls:index'))
-    except Http404:
-        messages.error(request, "The question doesn't exist")
-        logging.error(f"{user.username} try to access question "
-                      f"that does not exist")
-        return redirect(reverse('polls:index'))
+        pairs = parse_ballot(request)
+    except ValueError:
+        return JsonResponse({"error": 'Send {"votes": [{"question": id, "choice": id}, ...]} '
+                                      f"with at most {settings.BALLOT_MAX_VOTES} votes."}, status=400)
+    errors = ballot_errors(pairs)
+    votes = [Vote(user=user, question_id=pair[0], choice_id=pair[1])
+             for pair, error in zip(pairs, errors) if error is None]
+    for vote in votes:
+        wait_for_pending(user, vote.question_id)
+    record_votes(votes)
+    logger.info("%s voted on %d question(s) in a ballot", user.username, len(votes),
+                extra={"event": "ballot", "user": user.username, "votes": len(votes),
+                       "rejected": len(pairs) - len(votes)})
+    return JsonResponse({"recorded": len(votes), "results": [
+        {"question": pair and pair[0], "choice": pair and pair[1],
+         "status": "rejected" if error else "recorded", "error": error}
+        for pair, error in zip(pairs, errors)]})
@@ -0,0 +1,138 @@
+"""Record votes and keep the stored vote counter of each choice in step."""
+from collections import Counter
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .broker import broker
+from .cache import bump_results_version
+from .models import Choice, Question, Vote
+
+
+def record_vote(user, choice):
+    """
+    Record the vote of user for choice and update the vote counters.
+
+    Return True if anything was written.
+    """
+    return record_votes([Vote(user=user, question_id=choice.question_id,
+                              choice=choice)]) > 0
+
+
+def record_votes(votes):
+    """
+    Record a batch of unsaved votes and update the vote counters.
+
+    Repeated votes of the same user on the same question are coalesced and
+    the last one wins. The votes are written with a single upsert on the
+    (user, question) unique constraint, so a previous vote of a user is
+    changed instead of duplicated, and the counters are adjusted with a
+    single UPDATE in the same transaction. Return the number of votes that
+    were written.
+
+    The rows of the voters are locked first, in id order, so concurrent
+    batches of the same user are serialized: a first vote has no Vote row
+    to lock yet, and two of them would otherwise both count as new.
+    """
+    latest = {}
+    for vote in votes:
+        latest[(vote.user_id, vote.question_id)] = vote
+    if not latest:
+        return 0
+    keys = Q()
+    for user_id, question_id in latest:
+        keys |= Q(user_id=user_id, question_id=question_id)
+    with transaction.atomic():
+        lock_users({user_id for user_id, _ in latest})
+        previous = {
+            (user_id, question_id): choice_id
+            for user_id, question_id, choice_id in
+            Vote.objects.select_for_update().filter(keys).
+            values_list("user_id", "question_id", "choice_id")
+        }
+        changed = [vote for key, vote in latest.items()
+                   if previous.get(key) != vote.choice_id]
+        if not changed:
+            return 0
+        Vote.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["user", "question"],
+            update_fields=["choice", "voted_at"],
+        )
+        deltas = Counter()
+        for vote in changed:
+            deltas[vote.choice_id] += 1
+            prev_choice_id = previous.get((vote.user_id, vote.question_id))
+            if prev_choice_id is not None:
+                deltas[prev_choice_id] -= 1
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        Choice.objects.filter(pk__in=deltas).update(
+            vote_count=F("vote_count") + Case(
+                *[When(pk=pk, then=delta) for pk, delta in deltas.items()],
+                default=0))
+        question_ids = {vote.question_id for vote in changed}
+        touch_questions(question_ids)
+        transaction.on_commit(lambda: results_changed(question_ids))
+    return len(changed)
+
+
+def lock_users(user_ids):
+    """Lock the rows of users until the end of the transaction."""
+    list(get_user_model().objects.select_for_update().filter(pk__in=user_ids).
+         order_by("pk").values_list("pk", flat=True))
+
+
+def touch_questions(question_ids):
+    """Move the last modified time of questions to now."""
+    Question.objects.filter(pk__in=question_ids).update(
+        last_modified=timezone.now())
+
+
+def results_changed(question_ids):
+    """Invalidate the cached results and update the live results streams."""
+    for question_id in question_ids:
+        bump_results_version(question_id)
+        broker.notify(question_id)
+
+
+def recount_votes(choices=None):
+    """
+    Recompute the stored vote counter from the Vote table.
+
+    Only the given choices queryset is checked, or every choice if it is None.
+    Return the number of choices whose counter had drifted.
+    """
+    if choices is None:
+        choices = Choice.objects.all()
+    actual = Subquery(Vote.objects.filter(choice=OuterRef("pk")).
+                      order_by().values("choice").
+                      annotate(total=Count("pk")).values("total"))
+    drifted = choices.annotate(actual=Coalesce(actual, 0)).\
+        exclude(vote_count=F("actual"))
+    fixed = 0
+    question_ids = set()
+    with transaction.atomic():
+        for pk, question_id, count in drifted.values_list(
+                "pk", "question_id", "actual"):
+            fixed += Choice.objects.filter(pk=pk).update(vote_count=count)
+            question_ids.add(question_id)
+        touch_questions(question_ids)
+    results_changed(question_ids)
+    return fixed
+
+
+@receiver(post_delete, sender=Vote)
+def vote_deleted(sender, instance, **kwargs):
+    """
+    Take a deleted vote off the counter of its choice.
+
+    Votes are also deleted by cascade, with their user, choice or question,
+    which record_votes() and the admin never see.
+    """
+    Choice.objects.filter(pk=instance.choice_id).update(vote_count=F("vote_count") - 1)
+    touch_questions({instance.question_id})
+    transaction.on_commit(lambda: results_changed({instance.question_id}))